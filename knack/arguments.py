@@ -5,6 +5,7 @@
 
 import argparse
 from collections import defaultdict
+from functools import lru_cache
 
 from .deprecation import Deprecated
 from .preview import PreviewItem
@@ -26,7 +27,8 @@ class CLIArgumentType(object):
         :param overrides: The base argument that you are overriding
         :type overrides: knack.arguments.CLIArgumentType
         :param kwargs: Possible values: `options_list`, `validator`, `completer`, `nargs`, `action`, `const`, `default`,
-                       `type`, `choices`, `required`, `help`, `metavar`. See /docs/arguments.md.
+                       `type`, `choices`, `required`, `help`, `metavar`, `file_mode`, `file_encoding`.
+                       See /docs/arguments.md.
         """
         if isinstance(overrides, str):
             raise ValueError("Overrides has to be a {} (cannot be a string)".format(CLIArgumentType.__name__))
@@ -45,7 +47,7 @@ class CLIArgumentType(object):
 class CLICommandArgument(object):
 
     NAMED_ARGUMENTS = ['options_list', 'validator', 'completer', 'arg_group', 'deprecate_info', 'preview_info',
-                       'experimental_info', 'default_value_source']
+                       'experimental_info', 'default_value_source', 'file_mode', 'file_encoding']
 
     def __init__(self, dest=None, argtype=None, **kwargs):
         """An argument that has a specific destination parameter.
@@ -127,6 +129,53 @@ class ArgumentRegistry(object):
         return result
 
 
+# The kinds of status tags recorded in the namespace by the actions of tagged arguments
+_DEPRECATED_ARGUMENT = 'deprecated_argument'
+_DEPRECATED_OPTION = 'deprecated_option'
+_PREVIEW_ARGUMENT = 'preview_argument'
+_EXPERIMENTAL_ARGUMENT = 'experimental_argument'
+
+
+def _get_deprecated_option_info(action, option_string):
+    # Deprecated options are added to the parser as strings that carry their deprecate_info
+    return next((getattr(x, 'deprecate_info', None) for x in action.option_strings if x == option_string), None)
+
+
+# The class name, namespace attribute and function that gets the tag info from the action, by kind of status tag
+_STATUS_TAG_ACTIONS = {
+    _DEPRECATED_ARGUMENT: ('DeprecatedArgumentAction', '_argument_deprecations',
+                           lambda action, _: getattr(action, 'deprecate_info', None)),
+    _DEPRECATED_OPTION: ('DeprecatedOptionAction', '_argument_deprecations', _get_deprecated_option_info),
+    _PREVIEW_ARGUMENT: ('PreviewArgumentAction', '_argument_previews',
+                        lambda action, _: getattr(action, 'preview_info', None)),
+    _EXPERIMENTAL_ARGUMENT: ('ExperimentalArgumentAction', '_argument_experimentals',
+                             lambda action, _: getattr(action, 'experimental_info', None)),
+}
+
+
+@lru_cache(maxsize=None)
+def _get_status_tag_action(parent_class, kind):
+    """ Get the action class that records the status tag of an argument in the namespace when it is used, and then
+    acts like its parent class. The class is created once per parent class and kind of tag. The tag info is read
+    from the action instance, where the parser sets it. """
+    class_name, namespace_attr, get_info = _STATUS_TAG_ACTIONS[kind]
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        info = get_info(self, option_string)
+        if info:
+            if not hasattr(namespace, namespace_attr):
+                setattr(namespace, namespace_attr, [info])
+            else:
+                getattr(namespace, namespace_attr).append(info)
+        try:
+            super(action_class, self).__call__(parser, namespace, values, option_string)
+        except NotImplementedError:
+            setattr(namespace, self.dest, values)
+
+    action_class = type(class_name, (parent_class,), {'__call__': __call__, '_status_tag_kind': kind})
+    return action_class
+
+
 class ArgumentsContext(object):
     def __init__(self, command_loader, command_scope, **kwargs):  # pylint: disable=unused-argument
         """ Context manager to register arguments
@@ -173,57 +222,15 @@ class ArgumentsContext(object):
         return parent_class
 
     def _handle_deprecations(self, argument_dest, **kwargs):
-
-        def _handle_argument_deprecation(deprecate_info):
-
-            parent_class = self._get_parent_class(**kwargs)
-
-            class DeprecatedArgumentAction(parent_class):
-
-                def __call__(self, parser, namespace, values, option_string=None):
-                    if not hasattr(namespace, '_argument_deprecations'):
-                        setattr(namespace, '_argument_deprecations', [deprecate_info])
-                    else:
-                        namespace._argument_deprecations.append(deprecate_info)  # pylint: disable=protected-access
-                    try:
-                        super().__call__(parser, namespace, values, option_string)
-                    except NotImplementedError:
-                        setattr(namespace, self.dest, values)
-
-            return DeprecatedArgumentAction
-
-        def _handle_option_deprecation(deprecated_options):
-
-            if not isinstance(deprecated_options, list):
-                deprecated_options = [deprecated_options]
-
-            parent_class = self._get_parent_class(**kwargs)
-
-            class DeprecatedOptionAction(parent_class):
-
-                def __call__(self, parser, namespace, values, option_string=None):
-                    deprecated_opt = next((x for x in deprecated_options if option_string == x.target), None)
-                    if deprecated_opt:
-                        if not hasattr(namespace, '_argument_deprecations'):
-                            setattr(namespace, '_argument_deprecations', [deprecated_opt])
-                        else:
-                            namespace._argument_deprecations.append(deprecated_opt)  # pylint: disable=protected-access
-                    try:
-                        super().__call__(parser, namespace, values, option_string)
-                    except NotImplementedError:
-                        setattr(namespace, self.dest, values)
-
-            return DeprecatedOptionAction
-
         action = kwargs.get('action', None)
 
         deprecate_info = kwargs.get('deprecate_info', None)
         if deprecate_info:
             deprecate_info.target = deprecate_info.target or argument_dest
-            action = _handle_argument_deprecation(deprecate_info)
+            action = _get_status_tag_action(self._get_parent_class(**kwargs), _DEPRECATED_ARGUMENT)
         deprecated_opts = [x for x in kwargs.get('options_list', []) if isinstance(x, Deprecated)]
         if deprecated_opts:
-            action = _handle_option_deprecation(deprecated_opts)
+            action = _get_status_tag_action(self._get_parent_class(**kwargs), _DEPRECATED_OPTION)
         return action
 
     def _handle_previews(self, argument_dest, **kwargs):
@@ -231,24 +238,6 @@ class ArgumentsContext(object):
         if not kwargs.get('is_preview', False):
             return kwargs
 
-        def _handle_argument_preview(preview_info):
-
-            parent_class = self._get_parent_class(**kwargs)
-
-            class PreviewArgumentAction(parent_class):
-
-                def __call__(self, parser, namespace, values, option_string=None):
-                    if not hasattr(namespace, '_argument_previews'):
-                        setattr(namespace, '_argument_previews', [preview_info])
-                    else:
-                        namespace._argument_previews.append(preview_info)  # pylint: disable=protected-access
-                    try:
-                        super().__call__(parser, namespace, values, option_string)
-                    except NotImplementedError:
-                        setattr(namespace, self.dest, values)
-
-            return PreviewArgumentAction
-
         def _get_preview_arg_message(self):
             # "Argument xxx"
             subject = "{} '{}'".format(self.object_type.capitalize(), self.target)
@@ -274,7 +263,7 @@ class ArgumentsContext(object):
             message_func=_get_preview_arg_message
         )
         kwargs['preview_info'] = preview_info
-        kwargs['action'] = _handle_argument_preview(preview_info)
+        kwargs['action'] = _get_status_tag_action(self._get_parent_class(**kwargs), _PREVIEW_ARGUMENT)
         return kwargs
 
     def _handle_experimentals(self, argument_dest, **kwargs):
@@ -282,24 +271,6 @@ class ArgumentsContext(object):
         if not kwargs.get('is_experimental', False):
             return kwargs
 
-        def _handle_argument_experimental(experimental_info):
-
-            parent_class = self._get_parent_class(**kwargs)
-
-            class ExperimentalArgumentAction(parent_class):
-
-                def __call__(self, parser, namespace, values, option_string=None):
-                    if not hasattr(namespace, '_argument_experimentals'):
-                        setattr(namespace, '_argument_experimentals', [experimental_info])
-                    else:
-                        namespace._argument_experimentals.append(experimental_info)  # pylint: disable=protected-access
-                    try:
-                        super().__call__(parser, namespace, values, option_string)
-                    except NotImplementedError:
-                        setattr(namespace, self.dest, values)
-
-            return ExperimentalArgumentAction
-
         def _get_experimental_arg_message(self):
             # "Argument xxx"
             subject = "{} '{}'".format(self.object_type.capitalize(), self.target)
@@ -325,7 +296,7 @@ class ArgumentsContext(object):
             message_func=_get_experimental_arg_message
         )
         kwargs['experimental_info'] = experimental_info
-        kwargs['action'] = _handle_argument_experimental(experimental_info)
+        kwargs['action'] = _get_status_tag_action(self._get_parent_class(**kwargs), _EXPERIMENTAL_ARGUMENT)
         return kwargs
 
     # pylint: disable=inconsistent-return-statements
@@ -478,11 +449,51 @@ class IgnoreAction(argparse.Action):  # pylint: disable=too-few-public-methods
             option_string, values or ''))
 
 
+def _lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
 class CaseInsensitiveList(list):
-    """ Determine if a choice is in a choice list in a case-insensitive manner """
+    """ Determine if a choice is in a choice list in a case-insensitive manner.
+    Choices are looked up in an index of their lowercase forms, which is rebuilt after the list is modified. """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index = None
+
+    def _get_index(self):
+        index = getattr(self, '_index', None)
+        if index is None:
+            index = {}
+            for choice in self:
+                # The first of the choices that only differ by case is the canonical one
+                index.setdefault(_lower(choice), choice)
+            self._index = index
+        return index
 
     def __contains__(self, other):
-        return next((True for x in self if other.lower() == x.lower()), False)
+        return _lower(other) in self._get_index()
+
+    def get_choice(self, value):
+        """ Get the choice that matches a value in a case-insensitive manner
+
+        :param value: The value to look up
+        :type value: str
+        :return: The choice as it is spelled in the list, or None if there is no match
+        """
+        return self._get_index().get(_lower(value))
+
+
+def _invalidate_index(method):
+    def _wrapper(self, *args, **kwargs):
+        self._index = None  # pylint: disable=protected-access
+        return method(self, *args, **kwargs)
+    return _wrapper
+
+
+for _method_name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend', 'insert', 'pop',
+                     'remove', 'clear', 'reverse', 'sort'):
+    setattr(CaseInsensitiveList, _method_name, _invalidate_index(getattr(list, _method_name)))
 
 
 def enum_choice_list(data):
@@ -495,11 +506,15 @@ def enum_choice_list(data):
         choices = [x.value for x in data]
     except AttributeError:
         choices = data
+    choice_list = CaseInsensitiveList(choices)
 
     def _type(value):
-        return next((x for x in choices if x.lower() == value.lower()), value) if value else value
+        if not value:
+            return value
+        choice = choice_list.get_choice(value)
+        return value if choice is None else choice
     params = {
-        'choices': CaseInsensitiveList(choices),
+        'choices': choice_list,
         'type': _type
     }
     return params
@@ -3,9 +3,11 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import logging
 import os
 import sys
-from collections import defaultdict
+import time
+from collections import defaultdict, namedtuple
 
 from .invocation import CommandInvoker
 from .completion import CLICompletion
@@ -18,9 +20,27 @@ from .events import EVENT_CLI_PRE_EXECUTE, EVENT_CLI_SUCCESSFUL_EXECUTE, EVENT_C
 from .parser import CLICommandParser
 from .commands import CLICommandsLoader
 from .help import CLIHelp
+from .validators import ValidationCache
 
 logger = get_logger(__name__)
 
+_EventHandlerOptions = namedtuple('_EventHandlerOptions', ['priority', 'once', 'invocation_scoped', 'asynchronous'])
+
+
+class _EventHandlerRegistration(object):  # pylint: disable=too-few-public-methods
+    """ A handler registered with options. Each registration keeps its own options, so registering the same
+    handler again with other options doesn't change the first registration. """
+
+    def __init__(self, handler, options):
+        self.handler = handler
+        self.options = options
+
+    def __call__(self, cli_ctx, **kwargs):
+        return self.handler(cli_ctx, **kwargs)
+
+    def __repr__(self):
+        return repr(self.handler)
+
 
 class CLI(object):  # pylint: disable=too-many-instance-attributes
     """ The main driver for the CLI """
@@ -78,6 +98,13 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
         self.invocation_cls = invocation_cls
         self.invocation = None
         self._event_handlers = defaultdict(lambda: [])
+        self._invocation_scoped_handlers = []
+        self._event_executor = None
+        self._event_timings = {}
+        self.validation_cache = ValidationCache(self)
+        # An event loop running on another thread, for a host process that multiplexes the async command handlers
+        # of its invocations on one loop. By default, each invocation runs them on a new event loop.
+        self.event_loop = None
         # Data that's typically backed to persistent storage
         self.config = config_cls(
             config_dir=config_dir or os.path.expanduser(os.path.join('~', '.{}'.format(cli_name))),
@@ -96,6 +123,8 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
         self.init_info_log = []
 
         self.only_show_errors = self.config.getboolean('core', 'only_show_errors', fallback=False)
+        # Record the timings of event handlers even when debug logging is disabled. See `get_event_timings`.
+        self.collect_event_timings = self.config.getboolean('logging', 'collect_event_timings', fallback=False)
         self.enable_color = self._should_enable_color()
         # Enable VT mode only in Windows legacy terminal
         self._should_enable_vt_mode = self.enable_color and sys.platform == 'win32' and not is_modern_terminal()
@@ -133,16 +162,37 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
         version_info += self.get_runtime_version()
         print(version_info, file=self.out_file)
 
-    def register_event(self, event_name, handler):
+    def register_event(self, event_name, handler, priority=0, once=False, invocation_scoped=False,
+                       asynchronous=False):
         """ Register a callable that will be called when event is raised.
-            A handler will only be registered once.
+            Handlers with a higher priority are called first. Handlers with the same priority are called in the
+            order they were registered.
 
         :param event_name: The name of the event (see knack.events for in-built events)
         :type event_name: str
         :param handler: A callback to handle the event
         :type handler: function
+        :param priority: The priority of the handler
+        :type priority: int
+        :param once: Unregister the handler after it has been called once
+        :type once: bool
+        :param invocation_scoped: Unregister the handler when the current invocation finishes
+        :type invocation_scoped: bool
+        :param asynchronous: Call the handler on a background thread without waiting for it to finish.
+                             Useful for handlers such as telemetry upload that shouldn't block the command.
+        :type asynchronous: bool
         """
-        self._event_handlers[event_name].append(handler)
+        handlers = self._event_handlers[event_name]
+        entry = handler
+        if priority or once or invocation_scoped or asynchronous:
+            entry = _EventHandlerRegistration(handler, _EventHandlerOptions(
+                priority, once, invocation_scoped, asynchronous))
+        if invocation_scoped:
+            self._invocation_scoped_handlers.append((event_name, entry))
+        index = next((i for i, h in enumerate(handlers) if CLI._get_event_handler_priority(h) < priority),
+                     len(handlers))
+        # Handler lists are copied on write so that raise_event can iterate them without taking a snapshot
+        self._event_handlers[event_name] = handlers[:index] + [entry] + handlers[index:]
 
     def unregister_event(self, event_name, handler):
         """ Unregister a callable that will be called when event is raised.
@@ -152,10 +202,44 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
         :param handler: The callback that was used to register the event
         :type handler: function
         """
-        try:
-            self._event_handlers[event_name].remove(handler)
-        except ValueError:
-            pass
+        handlers = self._event_handlers.get(event_name, [])
+        index = next((i for i, h in enumerate(handlers)
+                      if h == handler or (isinstance(h, _EventHandlerRegistration) and h.handler == handler)), None)
+        if index is not None:
+            self._event_handlers[event_name] = handlers[:index] + handlers[index + 1:]
+
+    def _unregister_event_entry(self, event_name, entry):
+        # Remove this registration, not another registration of the same handler
+        handlers = self._event_handlers.get(event_name, [])
+        index = next((i for i, h in enumerate(handlers) if h is entry), None)
+        if index is not None:
+            self._event_handlers[event_name] = handlers[:index] + handlers[index + 1:]
+
+    @staticmethod
+    def _get_event_handler_priority(entry):
+        return entry.options.priority if isinstance(entry, _EventHandlerRegistration) else 0
+
+    def _unregister_invocation_scoped_events(self):
+        for event_name, entry in self._invocation_scoped_handlers:
+            self._unregister_event_entry(event_name, entry)
+        self._invocation_scoped_handlers = []
+
+    def _shutdown_event_executor(self):
+        # The handlers that were submitted still run, without blocking the end of the invocation
+        if self._event_executor:
+            self._event_executor.shutdown(wait=False)
+            self._event_executor = None
+
+    def _raise_event_asynchronously(self, event_name, func, kwargs):
+        if not self._event_executor:
+            from concurrent.futures import ThreadPoolExecutor
+            self._event_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='{}-event'.format(self.name))
+
+        def _log_failure(future):
+            if future.exception():
+                logger.debug('Asynchronous handler %s for event %s failed: %s', func, event_name, future.exception())
+
+        self._event_executor.submit(func, self, **kwargs).add_done_callback(_log_failure)
 
     def raise_event(self, event_name, **kwargs):
         """ Raise an event. Calls each handler in turn with kwargs
@@ -164,10 +248,67 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
         :type event_name: str
         :param kwargs: Kwargs to be passed to all event handlers
         """
-        handlers = list(self._event_handlers[event_name])
-        logger.debug('Event: %s %s', event_name, handlers)
+        handlers = self._event_handlers.get(event_name)
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        if debug_enabled:
+            logger.debug('Event: %s %s', event_name, handlers or [])
+        if not handlers:
+            return
+        timed = debug_enabled or self.collect_event_timings
         for func in handlers:
+            if isinstance(func, _EventHandlerRegistration):
+                entry, options, func = func, func.options, func.handler
+                if options.once:
+                    self._unregister_event_entry(event_name, entry)
+                if options.asynchronous:
+                    self._raise_event_asynchronously(event_name, func, kwargs)
+                    continue
+            if not timed:
+                func(self, **kwargs)
+                continue
+            start = time.perf_counter()
             func(self, **kwargs)
+            self._record_event_timing(event_name, func, (time.perf_counter() - start) * 1000, debug_enabled)
+
+    def _record_event_timing(self, event_name, func, elapsed_ms, debug_enabled):
+        handler_name = '{}.{}'.format(getattr(func, '__module__', None), getattr(func, '__qualname__', func))
+        stats = self._event_timings.get((event_name, handler_name))
+        if stats:
+            stats[0] += 1
+            stats[1] += elapsed_ms
+            stats[2] = max(stats[2], elapsed_ms)
+        else:
+            self._event_timings[(event_name, handler_name)] = [1, elapsed_ms, elapsed_ms]
+        if debug_enabled and self.logging.structured:
+            # Annotate the event with the duration of each handler so that slow phases can be found in aggregate
+            logger.debug('Event handler %s took %.3f ms', handler_name, elapsed_ms,
+                         extra={'phase': event_name, 'elapsed_ms': round(elapsed_ms, 3)})
+
+    def get_event_timings(self):
+        """ Get the timings of the event handlers called so far, slowest first.
+            Timings are recorded when `collect_event_timings` is set or debug logging is enabled.
+
+        :return: A list of dicts with `event`, `handler`, `count`, `total_ms` and `max_ms` keys
+        :rtype: list
+        """
+        timings = [{'event': event_name, 'handler': handler_name, 'count': count, 'total_ms': total, 'max_ms': maximum}
+                   for (event_name, handler_name), (count, total, maximum) in self._event_timings.items()]
+        return sorted(timings, key=lambda x: x['total_ms'], reverse=True)
+
+    def reset_event_timings(self):
+        """ Discard the event handler timings recorded so far. """
+        self._event_timings = {}
+
+    def _print_event_timings(self):
+        """Print a summary of the event handler timings to the debug log"""
+        if not self._event_timings or not logger.isEnabledFor(logging.DEBUG):
+            return
+        from tabulate import tabulate
+        rows = [(t['event'], t['handler'], t['count'], '{:.3f}'.format(t['total_ms']), '{:.3f}'.format(t['max_ms']))
+                for t in self.get_event_timings()]
+        logger.debug('Event handler timings:\n%s',
+                     tabulate(rows, headers=['Event', 'Handler', 'Count', 'Total (ms)', 'Max (ms)'],
+                              disable_numparse=True))
 
     def exception_handler(self, ex):
         """ The default exception handler """
@@ -216,6 +357,9 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
 
             args = self.completion.get_completion_args() or args
 
+            if self.logging.structured:
+                import uuid
+                self.data['invocation_id'] = uuid.uuid4().hex
             self.logging.configure(args)
             logger.debug('Command arguments: %s', args)
             self._print_init_log()
@@ -232,11 +376,12 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
                                                       initial_data=initial_invocation_data)
                 cmd_result = self.invocation.execute(args)
                 self.result = cmd_result
-                exit_code = self.result.exit_code
                 output_type = self.invocation.data['output']
                 if cmd_result and cmd_result.result is not None:
                     formatter = self.output.get_formatter(output_type)
                     self.output.out(cmd_result, formatter=formatter, out_file=out_file)
+                # Producing the output sets the exit code if the output was truncated
+                exit_code = self.result.exit_code
                 self.raise_event(EVENT_CLI_SUCCESSFUL_EXECUTE, result=cmd_result)
         except KeyboardInterrupt as ex:
             exit_code = 1
@@ -250,6 +395,9 @@ class CLI(object):  # pylint: disable=too-many-instance-attributes
             raise ex
         finally:
             self.raise_event(EVENT_CLI_POST_EXECUTE)
+            self._unregister_invocation_scoped_events()
+            self._shutdown_event_executor()
+            self._print_event_timings()
 
         return exit_code
 
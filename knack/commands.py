@@ -3,6 +3,7 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import inspect
 import types
 from collections import OrderedDict, defaultdict
 from importlib import import_module
@@ -189,6 +190,9 @@ class CLICommandsLoader(object):
         # An argument registry stores all arguments for commands
         self.argument_registry = ArgumentRegistry()
         self.extra_argument_registry = defaultdict(lambda: {})
+        # Functions that register the arguments of a scope, by scope
+        self._arguments_loaders = defaultdict(list)
+        self._loaded_arguments_scopes = set()
 
     def _populate_command_group_table_with_subgroups(self, name):
         if not name:
@@ -230,8 +234,37 @@ class CLICommandsLoader(object):
         with ArgumentsContext(self, '') as c:
             c.ignore('cmd')
 
+        self._run_arguments_loaders(command)
         self._apply_parameter_info(command, self.command_table[command])
 
+    def register_arguments_loader(self, scope, loader):
+        """ Register a function that registers the arguments of a scope. The function is only called when the
+            arguments of a command in the scope are loaded, so that the registrations of other scopes are not run.
+
+        :param scope: The command level the arguments are registered for (e.g. 'mygroup mycommand')
+        :type scope: str
+        :param loader: A function that is called with the knack.arguments.ArgumentsContext of the scope
+        :type loader: function
+        """
+        self._arguments_loaders[' '.join(scope.split())].append(loader)
+
+    def _run_arguments_loaders(self, command):
+        from knack.arguments import ArgumentsContext
+
+        if self.skip_applicability:
+            scopes = list(self._arguments_loaders)
+        else:
+            # The ancestor scopes of the command, from the least to the most specific
+            parts = command.split()
+            scopes = [' '.join(parts[:index]) for index in range(len(parts) + 1)]
+        for scope in scopes:
+            if scope in self._loaded_arguments_scopes or scope not in self._arguments_loaders:
+                continue
+            self._loaded_arguments_scopes.add(scope)
+            for loader in self._arguments_loaders[scope]:
+                with ArgumentsContext(self, scope) as c:
+                    loader(c)
+
     def _apply_parameter_info(self, command_name, command):
         for argument_name in command.arguments:
             overrides = self.argument_registry.get_cli_argument(command_name, argument_name)
@@ -253,6 +286,13 @@ class CLICommandsLoader(object):
         def _command_handler(command_args):
             op = CLICommandsLoader._get_op_handler(operation)
             client = client_factory(command_args) if client_factory else None
+            if inspect.isawaitable(client):
+                # The invoker waits for the result of async client factories and operations
+                async def _call_with_client():
+                    awaited_client = await client
+                    result = op(awaited_client, **command_args) if awaited_client else op(**command_args)
+                    return await result if inspect.isawaitable(result) else result
+                return _call_with_client()
             result = op(client, **command_args) if client else op(**command_args)
             return result
 
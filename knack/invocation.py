@@ -3,6 +3,7 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import inspect
 import sys
 from collections import defaultdict
 
@@ -17,7 +18,8 @@ from .help import CLIHelp
 from .log import CLILogging
 from .parser import CLICommandParser
 from .preview import ImplicitPreviewItem, resolve_preview_info
-from .util import CLIError, CtxTypeError, CommandResultItem, todict
+from .util import CLIError, CtxTypeError, CommandResultItem, run_awaitable, todict, todict_lazy, todict_ordered
+from .validators import run_validator, run_validators
 
 
 class CommandInvoker(object):
@@ -90,19 +92,20 @@ class CommandInvoker(object):
 
     def _validate_cmd_level(self, ns, cmd_validator):
         if cmd_validator:
-            cmd_validator(ns)
+            run_validator(cmd_validator, ns, self.cli_ctx.validation_cache, self.cli_ctx.event_loop)
         try:
             delattr(ns, '_command_validator')
         except AttributeError:
             pass
 
     def _validate_arg_level(self, ns, **_):
-        for validator in getattr(ns, '_argument_validators', []):
-            validator(ns)
-        try:
-            delattr(ns, '_argument_validators')
-        except AttributeError:
-            pass
+        run_validators(getattr(ns, '_argument_validators', []), getattr(ns, '_argument_validator_dests', []), ns,
+                       self.cli_ctx.validation_cache, self.cli_ctx.event_loop)
+        for attr in ('_argument_validators', '_argument_validator_dests'):
+            try:
+                delattr(ns, attr)
+            except AttributeError:
+                pass
 
     def _validation(self, parsed_ns):
         try:
@@ -127,6 +130,8 @@ class CommandInvoker(object):
         :rtype: knack.util.CommandResultItem
         """
 
+        if self.cli_ctx.config.getboolean('core', 'prefetch_files', fallback=False):
+            self.parser.prefetch_prefixed_files(args)
         self.cli_ctx.raise_event(EVENT_INVOKER_PRE_CMD_TBL_CREATE, args=args)
         cmd_tbl = self.commands_loader.load_command_table(args)
         command = self._rudimentary_get_command(args)
@@ -222,11 +227,20 @@ class CommandInvoker(object):
                 print(p.message, file=sys.stderr)
 
         cmd_result = parsed_args.func(params)
-        cmd_result = todict(cmd_result)
+        if inspect.isawaitable(cmd_result):
+            # async def handlers and client factories
+            cmd_result = run_awaitable(cmd_result, self.cli_ctx.event_loop)
+        # A query usually selects a small part of the result, so only convert the parts it touches.
+        # The rest of the query result is converted once the query has been applied.
+        query_active = self.data['query_active']
+        cmd_result = todict_lazy(cmd_result) if query_active else todict(cmd_result)
 
         event_data = {'result': cmd_result}
         self.cli_ctx.raise_event(EVENT_INVOKER_TRANSFORM_RESULT, event_data=event_data)
         self.cli_ctx.raise_event(EVENT_INVOKER_FILTER_RESULT, event_data=event_data)
+        if query_active:
+            # Keep the order of the fields selected by the query
+            event_data['result'] = todict_ordered(event_data['result'])
 
         return CommandResultItem(event_data['result'],
                                  exit_code=0,
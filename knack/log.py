@@ -4,7 +4,9 @@
 # --------------------------------------------------------------------------------------------
 
 import os
+import json
 import logging
+from datetime import datetime, timezone
 from enum import IntEnum
 
 from .util import CtxTypeError, ensure_dir, CLIError, color_map
@@ -18,6 +20,9 @@ cli_logger_names = [CLI_LOGGER_NAME]
 
 LOG_FILE_ENCODING = 'utf-8'
 
+LOG_FORMAT_TEXT = 'text'
+LOG_FORMAT_JSON = 'json'
+
 
 class CliLogLevel(IntEnum):
     CRITICAL = 0
@@ -65,6 +70,34 @@ class _CustomStreamHandler(logging.StreamHandler):
         return msg
 
 
+class _JsonLinesFormatter(logging.Formatter):
+    """ Format each record as a single-line JSON object so that log pipelines can ingest it without parsing.
+
+    Records may carry `phase` (e.g. the event name) and `elapsed_ms` fields through the `extra` kwarg of the
+    logging call. The invocation id and the command name are taken from the CLI context.
+    """
+
+    def __init__(self, cli_ctx):
+        super().__init__()
+        self.cli_ctx = cli_ctx
+
+    def format(self, record):
+        invocation_data = getattr(self.cli_ctx.invocation, 'data', None) or {}
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'invocationId': self.cli_ctx.data['invocation_id'],
+            'command': invocation_data.get('command'),
+            'phase': getattr(record, 'phase', None),
+            'elapsedMs': getattr(record, 'elapsed_ms', None),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
 class CLILogging:  # pylint: disable=too-many-instance-attributes
 
     DEBUG_FLAG = '--debug'
@@ -97,6 +130,7 @@ class CLILogging:  # pylint: disable=too-many-instance-attributes
         self.logfile_name = '{}.log'.format(name)
         self.file_log_enabled = CLILogging._is_file_log_enabled(cli_ctx)
         self.log_dir = CLILogging._get_log_dir(cli_ctx)
+        self.log_format = CLILogging._get_log_format(cli_ctx)
         self.cli_ctx = cli_ctx
         self.cli_ctx.register_event(EVENT_PARSER_GLOBAL_CREATE, CLILogging.on_global_arguments)
 
@@ -119,13 +153,19 @@ class CLILogging:  # pylint: disable=too-many-instance-attributes
         console_log_levels = self._get_console_log_levels()
         console_log_formats = self._get_console_log_formats()
 
-        # Set the levels of the loggers to lowest level.
+        # Set the level of the root logger to lowest level.
         # Handlers can override by choosing a higher level.
         root_logger.setLevel(logging.DEBUG)
 
+        # When the CLI loggers only have the handlers added here, set their level to the lowest level those handlers
+        # accept. This lets `logger.debug` calls return immediately when debug logs are not shown anywhere.
+        # Handlers that were attached to them elsewhere may want every record, so keep the lowest level then.
         cli_loggers = [logging.getLogger(logger_name) for logger_name in cli_logger_names]
+        has_other_handlers = any(cli_logger.handlers for cli_logger in cli_loggers)
+        cli_logger_level = logging.DEBUG if self.file_log_enabled or has_other_handlers \
+            else console_log_levels['cli']
         for cli_logger in cli_loggers:
-            cli_logger.setLevel(logging.DEBUG)
+            cli_logger.setLevel(cli_logger_level)
             cli_logger.propagate = False
 
         self._init_console_handlers(root_logger, cli_loggers, console_log_levels, console_log_formats)
@@ -152,12 +192,20 @@ class CLILogging:  # pylint: disable=too-many-instance-attributes
             return CliLogLevel.ERROR
         return CliLogLevel.WARNING  # default to show WARNINGs and above
 
+    @property
+    def structured(self):
+        """ Whether logs are written as JSON-lines records instead of human-formatted text. """
+        return self.log_format == LOG_FORMAT_JSON
+
     def _init_console_handlers(self, root_logger, cli_loggers, log_levels, log_formats):
-        root_logger.addHandler(_CustomStreamHandler(log_levels['root'],
-                                                    log_formats['root'],
-                                                    self.cli_ctx.enable_color))
+        root_console_handler = _CustomStreamHandler(log_levels['root'], log_formats['root'],
+                                                    self.cli_ctx.enable_color and not self.structured)
         cli_logger_console_handler = _CustomStreamHandler(log_levels['cli'], log_formats['cli'],
-                                                          self.cli_ctx.enable_color)
+                                                          self.cli_ctx.enable_color and not self.structured)
+        if self.structured:
+            root_console_handler.setFormatter(_JsonLinesFormatter(self.cli_ctx))
+            cli_logger_console_handler.setFormatter(_JsonLinesFormatter(self.cli_ctx))
+        root_logger.addHandler(root_console_handler)
         for cli_logger in cli_loggers:
             cli_logger.addHandler(cli_logger_console_handler)
 
@@ -167,7 +215,10 @@ class CLILogging:  # pylint: disable=too-many-instance-attributes
         from logging.handlers import RotatingFileHandler
         logfile_handler = RotatingFileHandler(log_file_path, maxBytes=10 * 1024 * 1024, backupCount=5,
                                               encoding=LOG_FILE_ENCODING)
-        lfmt = logging.Formatter('%(process)d : %(asctime)s : %(levelname)s : %(name)s : %(message)s')
+        if self.structured:
+            lfmt = _JsonLinesFormatter(self.cli_ctx)
+        else:
+            lfmt = logging.Formatter('%(process)d : %(asctime)s : %(levelname)s : %(name)s : %(message)s')
         logfile_handler.setFormatter(lfmt)
         logfile_handler.setLevel(logging.DEBUG)
         root_logger.addHandler(logfile_handler)
@@ -178,6 +229,12 @@ class CLILogging:  # pylint: disable=too-many-instance-attributes
     def _is_file_log_enabled(cli_ctx):
         return cli_ctx.config.getboolean('logging', 'enable_log_file', fallback=False)
 
+    @staticmethod
+    def _get_log_format(cli_ctx):
+        log_format = cli_ctx.config.get('logging', 'log_format', fallback=LOG_FORMAT_TEXT).lower()
+        # Unknown formats fall back to text, as logging is not configured yet to report the problem
+        return log_format if log_format in (LOG_FORMAT_TEXT, LOG_FORMAT_JSON) else LOG_FORMAT_TEXT
+
     @staticmethod
     def _get_log_dir(cli_ctx):
         default_dir = os.path.join(cli_ctx.config.config_dir, 'logs')
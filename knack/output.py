@@ -3,11 +3,17 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import copy
 import errno
 import json
+import struct
 import traceback
-from collections import OrderedDict
-from io import StringIO
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from importlib import import_module
+from io import StringIO, TextIOBase
+from json.encoder import encode_basestring
+from operator import itemgetter
 
 from .events import EVENT_INVOKER_POST_PARSE_ARGS, EVENT_PARSER_GLOBAL_CREATE
 from .log import get_logger
@@ -38,23 +44,293 @@ def format_json(obj):
                       separators=(',', ': ')) + '\n'
 
 
+# Number of list items encoded into each chunk written by the streaming formatters
+STREAMING_CHUNK_SIZE = 1000
+
+# Exit code of a command whose output was cut at the byte limit, as the cut output may still look complete
+OUTPUT_TRUNCATED_EXIT_CODE = 3
+
+
+def _streaming_formatter(formatter):
+    """ Declare that the formatter returns an iterable of chunks instead of a string """
+    formatter.supports_streaming = True
+    return formatter
+
+
+def _item_streaming_formatter(formatter):
+    """ Declare that the formatter streams the items of a list result independently, so that its output for a list
+    is its output for the first items followed by its output for the others """
+    formatter.streams_items = True
+    return _streaming_formatter(formatter)
+
+
+def _get_compact_json_encode():
+    return _ComplexEncoder(ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode
+
+
+@_streaming_formatter
+def format_json_compact(obj):
+    """ Format the result as JSON without indentation, so that the C-accelerated encoder is used.
+    List results are encoded in chunks that are written as they are produced. """
+    result = obj.result
+    encode = _get_compact_json_encode()
+    if not isinstance(result, list):
+        yield encode(result) + '\n'
+        return
+    separator = '['
+    for start in range(0, len(result), STREAMING_CHUNK_SIZE):
+        yield separator + ','.join(encode(item) for item in result[start:start + STREAMING_CHUNK_SIZE])
+        separator = ','
+    yield ']\n' if result else '[]\n'
+
+
+@_item_streaming_formatter
+def format_jsonl(obj):
+    """ Format the result as JSON lines: one compact JSON value per item of a list result.
+    The lines are written in chunks as they are produced. """
+    result = obj.result
+    encode = _get_compact_json_encode()
+    if not isinstance(result, list):
+        yield encode(result) + '\n'
+        return
+    for start in range(0, len(result), STREAMING_CHUNK_SIZE):
+        yield ''.join(encode(item) + '\n' for item in result[start:start + STREAMING_CHUNK_SIZE])
+
+
+def _iter_frames(result, encode):
+    """ Encode the result as frames that each hold a 4-byte big-endian length followed by the encoded value.
+    List results are written as one frame per item, in chunks as they are produced. """
+    pack_length = struct.Struct('>I').pack
+
+    def _frame(value):
+        payload = encode(value)
+        return pack_length(len(payload)) + payload
+
+    if not isinstance(result, list):
+        yield _frame(result)
+        return
+    for start in range(0, len(result), STREAMING_CHUNK_SIZE):
+        yield b''.join(_frame(item) for item in result[start:start + STREAMING_CHUNK_SIZE])
+
+
+@_item_streaming_formatter
+def format_msgpack(obj):
+    """ Format the result as length-prefixed MessagePack frames. Requires the msgpack package. """
+    try:
+        import msgpack
+    except ImportError as ex:
+        raise CLIError("The msgpack output format requires the 'msgpack' package. "
+                       "Install it with 'pip install msgpack'.") from ex
+    return _iter_frames(obj.result, msgpack.Packer(use_bin_type=True).pack)
+
+
+@_item_streaming_formatter
+def format_cbor(obj):
+    """ Format the result as length-prefixed CBOR frames. Requires the cbor2 package. """
+    try:
+        import cbor2
+    except ImportError as ex:
+        raise CLIError("The cbor output format requires the 'cbor2' package. "
+                       "Install it with 'pip install cbor2'.") from ex
+    return _iter_frames(obj.result, cbor2.dumps)
+
+
+# The ANSI codes used by the pygments TerminalFormatter for the tokens of JSON and YAML output
+_COLOR_KEY = '\x1b[94m'
+_COLOR_STRING = '\x1b[33m'
+_COLOR_LITERAL = '\x1b[34m'
+_COLOR_RESET = '\x1b[39;49;00m'
+
+
+class _ColorFallback(Exception):
+    """ Raised when the result holds values that only the pygments based colorization handles """
+
+
+class _JsonColorizer(object):  # pylint: disable=too-few-public-methods
+    """ Serializes a result to colored JSON in a single pass, with the layout of format_json """
+
+    def __init__(self):
+        self._parts = []
+
+    def dump(self, result):
+        self._encode(result, '\n')
+        self._parts.append('\n')
+        return ''.join(self._parts)
+
+    def _encode(self, o, newline):  # pylint: disable=too-many-branches
+        append = self._parts.append
+        if isinstance(o, str):
+            append(_COLOR_STRING + encode_basestring(o) + _COLOR_RESET)
+        elif o is None:
+            append(_COLOR_LITERAL + 'null' + _COLOR_RESET)
+        elif o is True:
+            append(_COLOR_LITERAL + 'true' + _COLOR_RESET)
+        elif o is False:
+            append(_COLOR_LITERAL + 'false' + _COLOR_RESET)
+        elif isinstance(o, int):
+            append(_COLOR_LITERAL + int.__repr__(o) + _COLOR_RESET)
+        elif isinstance(o, float):
+            if o != o or o in (float('inf'), float('-inf')):  # pylint: disable=comparison-with-itself
+                raise _ColorFallback()
+            append(_COLOR_LITERAL + float.__repr__(o) + _COLOR_RESET)
+        elif isinstance(o, (bytes, bytearray)):
+            append(_COLOR_STRING + encode_basestring(o.decode()) + _COLOR_RESET)
+        elif isinstance(o, dict):
+            if not o:
+                append('{}')
+                return
+            if not all(isinstance(key, str) for key in o):
+                raise _ColorFallback()
+            inner_newline = newline + '  '
+            separator = '{' + inner_newline
+            for key, value in sorted(o.items(), key=itemgetter(0)):
+                append(separator + _COLOR_KEY + encode_basestring(key) + _COLOR_RESET + ': ')
+                self._encode(value, inner_newline)
+                separator = ',' + inner_newline
+            append(newline + '}')
+        elif isinstance(o, (list, tuple)):
+            if not o:
+                append('[]')
+                return
+            inner_newline = newline + '  '
+            separator = '[' + inner_newline
+            for value in o:
+                append(separator)
+                self._encode(value, inner_newline)
+                separator = ',' + inner_newline
+            append(newline + ']')
+        else:
+            raise _ColorFallback()
+
+
 def format_json_color(obj):
+    result = obj.result
+    input_dict = dict(result) if hasattr(result, '__dict__') else result
+    try:
+        return _JsonColorizer().dump(input_dict)
+    except (_ColorFallback, RecursionError):
+        pass
     from pygments import highlight, lexers, formatters
     return highlight(format_json(obj), lexers.JsonLexer(), formatters.TerminalFormatter())  # pylint: disable=no-member
 
 
-def format_yaml(obj):
+def _add_yaml_representers(dumper_cls):
+    """ Represent the types found in command results, e.g. the OrderedDict results of --query,
+    the way they would be represented after a round trip through JSON """
+    from yaml.representer import SafeRepresenter
+    dumper_cls.add_representer(OrderedDict, SafeRepresenter.represent_dict)
+    dumper_cls.add_representer(tuple, SafeRepresenter.represent_list)
+    dumper_cls.add_multi_representer(dict, SafeRepresenter.represent_dict)
+    dumper_cls.add_multi_representer(list, SafeRepresenter.represent_list)
+    dumper_cls.add_multi_representer(str, lambda dumper, data: dumper.represent_str(str.__str__(data)))
+    dumper_cls.add_multi_representer(int, lambda dumper, data: dumper.represent_int(int(data)))
+    dumper_cls.add_multi_representer(float, lambda dumper, data: dumper.represent_float(float(data)))
+
+
+@lru_cache(maxsize=None)
+def _get_yaml_dumper(use_libyaml=True):
     import yaml
-    try:
-        return yaml.safe_dump(obj.result, default_flow_style=False, allow_unicode=True)
-    except yaml.representer.RepresenterError:
-        # yaml.safe_dump fails when obj.result is an OrderedDict. knack's --query implementation converts the result to an OrderedDict. https://github.com/microsoft/knack/blob/af674bfea793ff42ae31a381a21478bae4b71d7f/knack/query.py#L46. # pylint: disable=line-too-long
-        return yaml.safe_dump(json.loads(json.dumps(obj.result)), default_flow_style=False, allow_unicode=True)
+
+    base = getattr(yaml, 'CSafeDumper', yaml.SafeDumper) if use_libyaml else yaml.SafeDumper
+
+    class _YamlDumper(base):  # pylint: disable=too-many-ancestors
+
+        def ignore_aliases(self, data):
+            # Objects found more than once in a result are written out each time, not as anchors and aliases
+            return True
+
+    _add_yaml_representers(_YamlDumper)
+    return _YamlDumper
+
+
+@lru_cache(maxsize=None)
+def _get_yaml_color_dumper():
+    import yaml
+
+    class _YamlColorDumper(yaml.SafeDumper):  # pylint: disable=too-many-ancestors
+        """ Colors the scalars as they are emitted. The color codes are written straight to the stream
+        so that they are not counted in the column used to lay out the document. """
+
+        def process_scalar(self):
+            if self.simple_key_context:
+                color = _COLOR_KEY
+            elif self.style:
+                # Quoted and block scalars. Plain scalars are not colored, like the pygments YamlLexer does.
+                color = _COLOR_STRING
+            else:
+                color = None
+            if color:
+                self.stream.write(color)
+                super().process_scalar()
+                self.stream.write(_COLOR_RESET)
+            else:
+                super().process_scalar()
+
+        def ignore_aliases(self, data):
+            return True
+
+    _add_yaml_representers(_YamlColorDumper)
+    return _YamlColorDumper
+
+
+def _dump_yaml(data, dumper):
+    import yaml
+    return yaml.dump(data, Dumper=dumper, default_flow_style=False, allow_unicode=True)
+
+
+def _iter_yaml_chunks(result):
+    """ Split a list result in chunks that are dumped separately. Dumping the chunks of a block sequence
+    produces the same document as dumping the whole list. """
+    if isinstance(result, list) and result:
+        for start in range(0, len(result), STREAMING_CHUNK_SIZE):
+            yield result[start:start + STREAMING_CHUNK_SIZE]
+    else:
+        yield result
+
+
+def _dump_yaml_fast(data):
+    """ Dump with libyaml when it is available. libyaml escapes the characters outside of the Basic Multilingual
+    Plane even when unicode is allowed, and ends documents holding a single scalar differently, so those are
+    dumped with the Python emitter to keep the output the same. """
+    if not isinstance(data, (dict, list)):
+        return _dump_yaml(data, _get_yaml_dumper(use_libyaml=False))
+    output = _dump_yaml(data, _get_yaml_dumper())
+    if '\\U' in output:
+        output = _dump_yaml(data, _get_yaml_dumper(use_libyaml=False))
+    return output
+
+
+def format_yaml(obj):
+    return ''.join(format_yaml_chunks(obj))
+
+
+@_item_streaming_formatter
+def format_yaml_chunks(obj):
+    """ Format the result as YAML. List results are dumped in chunks that are written as they are produced. """
+    from yaml.representer import RepresenterError
+    for data in _iter_yaml_chunks(obj.result):
+        try:
+            yield _dump_yaml_fast(data)
+        except RepresenterError:
+            # Fall back to a round trip through JSON for the types that have no representer
+            yield _dump_yaml_fast(json.loads(json.dumps(data)))
 
 
 def format_yaml_color(obj):
-    from pygments import highlight, lexers, formatters
-    return highlight(format_yaml(obj), lexers.YamlLexer(), formatters.TerminalFormatter())  # pylint: disable=no-member
+    return ''.join(format_yaml_color_chunks(obj))
+
+
+@_item_streaming_formatter
+def format_yaml_color_chunks(obj):
+    from yaml.representer import RepresenterError
+    dumper = _get_yaml_color_dumper()
+    for data in _iter_yaml_chunks(obj.result):
+        try:
+            yield _dump_yaml(data, dumper)
+        except RepresenterError:
+            from pygments import highlight, lexers, formatters
+            yield highlight(_dump_yaml_fast(json.loads(json.dumps(data))),
+                            lexers.YamlLexer(), formatters.TerminalFormatter())  # pylint: disable=no-member
 
 
 def format_none(_):
@@ -82,9 +358,36 @@ def format_table(obj):
 
 
 def format_tsv(obj):
+    return ''.join(format_tsv_chunks(obj))
+
+
+@_item_streaming_formatter
+def format_tsv_chunks(obj):
+    """ Format the result as TSV. Rows are written in chunks as they are produced. """
     result = obj.result
     result_list = result if isinstance(result, list) else [result]
-    return _TsvOutput.dump(result_list)
+    return _ColumnarOutput('\t').iter_dump(result_list)
+
+
+@_streaming_formatter
+def format_csv(obj):
+    """ Format the result as CSV with a header row. The columns are the keys of the first item, in the order
+    given by --query if it is used. Rows are written in chunks as they are produced. """
+    import csv
+    result = obj.result
+    result_list = result if isinstance(result, list) else [result]
+    return _ColumnarOutput(',', quoting=csv.QUOTE_MINIMAL).iter_dump(result_list)
+
+
+_FormatterInfo = namedtuple('_FormatterInfo', ['formatter', 'streaming'])
+
+# The built-in formatters that return strings, e.g. from get_formatter, and the formatters that out() uses instead
+# to write their output in chunks
+_CHUNK_FORMATTERS = {
+    format_yaml: format_yaml_chunks,
+    format_yaml_color: format_yaml_color_chunks,
+    format_tsv: format_tsv_chunks,
+}
 
 
 class OutputProducer(object):
@@ -93,11 +396,16 @@ class OutputProducer(object):
 
     _FORMAT_DICT = {
         'json': format_json,
+        'json-compact': format_json_compact,
         'jsonc': format_json_color,
+        'jsonl': format_jsonl,
         'yaml': format_yaml,
         'yamlc': format_yaml_color,
         'table': format_table,
+        'csv': format_csv,
         'tsv': format_tsv,
+        'msgpack': format_msgpack,
+        'cbor': format_cbor,
         'none': format_none,
     }
 
@@ -105,16 +413,24 @@ class OutputProducer(object):
     def on_global_arguments(cli_ctx, **kwargs):
         arg_group = kwargs.get('arg_group')
         arg_group.add_argument('--output', '-o', dest=OutputProducer.ARG_DEST,
-                               choices=list(OutputProducer._FORMAT_DICT),
+                               choices=cli_ctx.output.formats,
                                default=cli_ctx.config.get('core', 'output', fallback='json'),
                                help='Output format',
                                type=str.lower)
+        arg_group.add_argument('--output-max-items', dest='_output_max_items', type=int, metavar='COUNT',
+                               help='Truncate list results to this number of items. '
+                                    'Defaults to section=core, option=output_max_items in config.')
+        arg_group.add_argument('--output-max-bytes', dest='_output_max_bytes', type=int, metavar='SIZE',
+                               help='Truncate the output to this number of bytes. '
+                                    'Defaults to section=core, option=output_max_bytes in config.')
 
     @staticmethod
     def handle_output_argument(cli_ctx, **kwargs):
         args = kwargs.get('args')
         # Set the output type for this invocation
         cli_ctx.invocation.data['output'] = getattr(args, OutputProducer.ARG_DEST)
+        cli_ctx.invocation.data['output_max_items'] = getattr(args, '_output_max_items', None)
+        cli_ctx.invocation.data['output_max_bytes'] = getattr(args, '_output_max_bytes', None)
 
     def __init__(self, cli_ctx=None):
         """ Manages the production of output from the result of a command invocation
@@ -126,6 +442,10 @@ class OutputProducer(object):
         if cli_ctx is not None and not isinstance(cli_ctx, CLI):
             raise CtxTypeError(cli_ctx)
         self.cli_ctx = cli_ctx
+        self._encode_error_reported = False
+        # Whether each format streams is read from the `supports_streaming` attribute of its formatter
+        self._formatters = {name: _FormatterInfo(formatter, None)
+                            for name, formatter in OutputProducer._FORMAT_DICT.items()}
         self.cli_ctx.register_event(EVENT_PARSER_GLOBAL_CREATE, OutputProducer.on_global_arguments)
         self.cli_ctx.register_event(EVENT_INVOKER_POST_PARSE_ARGS, OutputProducer.handle_output_argument)
 
@@ -143,27 +463,340 @@ class OutputProducer(object):
         if not isinstance(obj, CommandResultItem):
             raise TypeError('Expected {} got {}'.format(CommandResultItem.__name__, type(obj)))
 
+        result_item = obj
+        formatter = _CHUNK_FORMATTERS.get(formatter, formatter)
+        streaming = self._is_streaming(formatter)
+        obj, limiter = self._get_limiter(obj, formatter, streaming)
         output = formatter(obj)
+        chunks = output if streaming else [output]
+        if limiter:
+            chunks = limiter.iter_chunks(chunks)
         try:
-            print(output, file=out_file, end='')
+            pager = self._get_pager(out_file)
+            if pager:
+                self._out_paged(chunks, out_file, pager)
+            else:
+                for chunk in chunks:
+                    self._write(chunk, out_file)
+                    if streaming:
+                        # Flush each chunk so that consumers can start processing the output
+                        # before all of it has been formatted
+                        out_file.flush()
         except IOError as ex:
             if ex.errno == errno.EPIPE:
                 pass
             else:
                 raise
+        finally:
+            if limiter:
+                limiter.close()
+        if limiter:
+            limiter.report()
+            if limiter.truncated_bytes:
+                result_item.exit_code = OUTPUT_TRUNCATED_EXIT_CODE
+
+    def _get_limiter(self, obj, formatter, streaming):
+        """ Get the limiter of the output, or None if it isn't limited, along with the result cut to the item limit """
+        max_items = self._get_output_limit('output_max_items')
+        max_bytes = self._get_output_limit('output_max_bytes')
+        if max_items and isinstance(obj.result, list) and len(obj.result) > max_items:
+            limiter = _OutputLimiter(max_bytes, self._create_spill_file())
+            limiter.truncated_items = (max_items, len(obj.result))
+            kept_obj = copy.copy(obj)
+            kept_obj.result = obj.result[:max_items]
+            if limiter.spill_file and getattr(formatter, 'streams_items', False):
+                # The output of the kept items is spilled as it is written, followed by the output of the others
+                rest_obj = copy.copy(obj)
+                rest_obj.result = obj.result[max_items:]
+                limiter.spill_rest = lambda: formatter(rest_obj)
+            elif limiter.spill_file:
+                # The output can't be split by items, so the whole result is spilled before it is truncated
+                output = formatter(obj)
+                limiter.spill(output if streaming else [output])
+                limiter.spill_file.close()
+                limiter.spill_file = None
+            return kept_obj, limiter
+        if max_bytes:
+            return obj, _OutputLimiter(max_bytes, self._create_spill_file())
+        return obj, None
+
+    def _get_output_limit(self, name):
+        invocation = self.cli_ctx.invocation
+        value = invocation.data.get(name) if invocation else None
+        if value is None:
+            value = self.cli_ctx.config.getint('core', name, fallback=0)
+        return value if value > 0 else None
+
+    def _create_spill_file(self):
+        if not self.cli_ctx.config.getboolean('core', 'output_spill', fallback=False):
+            return None
+        import tempfile
+        return tempfile.NamedTemporaryFile(mode='wb', prefix='{}-output-'.format(self.cli_ctx.name),  # pylint: disable=consider-using-with
+                                           delete=False)
+
+    def _get_pager(self, out_file):
+        pager = self.cli_ctx.config.get('core', 'pager', fallback=None)
+        if not pager:
+            return None
+        try:
+            return pager if out_file.isatty() else None
+        except (AttributeError, ValueError):
+            return None
+
+    def _out_paged(self, chunks, out_file, pager):
+        """ Write the chunks of the output through the pager if it is taller than the terminal.
+        Chunks are passed to the pager as they are produced and no more are formatted once the pager is closed. """
+        import itertools
+        import shutil
+        import subprocess
+
+        chunks = iter(chunks)
+        height = shutil.get_terminal_size().lines
+        buffered = []
+        line_count = 0
+        for chunk in chunks:
+            buffered.append(chunk)
+            if isinstance(chunk, bytes):
+                # Binary output is never paged
+                break
+            line_count += chunk.count('\n')
+            if line_count >= height:
+                break
+        else:
+            for chunk in buffered:
+                self._write(chunk, out_file)
+            return
+
+        if not isinstance(buffered[-1], bytes):
+            try:
+                pager_process = subprocess.Popen(pager, shell=True, stdin=subprocess.PIPE,  # pylint: disable=consider-using-with
+                                                 universal_newlines=True, errors='replace',
+                                                 encoding=getattr(out_file, 'encoding', None))
+            except OSError as ex:
+                logger.warning("Unable to start the pager '%s': %s", pager, ex)
+            else:
+                # The shell runs the pager, so a pager that can't be run only shows in the exit code. The chunks
+                # written to it are kept to write them to the output file instead.
+                paged = []
+                try:
+                    for chunk in itertools.chain(buffered, chunks):
+                        paged.append(chunk)
+                        pager_process.stdin.write(chunk)
+                        pager_process.stdin.flush()
+                except BrokenPipeError:
+                    # The pager was closed before the end of the output, or it failed
+                    pass
+                try:
+                    pager_process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                if pager_process.wait() == 0:
+                    if hasattr(chunks, 'close'):
+                        chunks.close()
+                    return
+                logger.warning("The pager '%s' failed with exit code %d", pager, pager_process.returncode)
+                buffered = paged
+
+        for chunk in itertools.chain(buffered, chunks):
+            self._write(chunk, out_file)
+            out_file.flush()
+
+    def _write(self, output, out_file):
+        if isinstance(output, bytes):
+            # Binary formats are written to the buffer underneath a text file such as sys.stdout
+            out_file = getattr(out_file, 'buffer', out_file)
+            if isinstance(out_file, TextIOBase):
+                raise CLIError('Unable to write binary output to a text stream. '
+                               'Use a text output format or write the output to a binary file.')
+            out_file.write(output)
+            return
+        try:
+            print(output, file=out_file, end='')
         except UnicodeEncodeError:
-            logger.warning("Unable to encode the output with %s encoding. Unsupported characters are discarded.",
-                           out_file.encoding)
+            if not self._encode_error_reported:
+                logger.warning("Unable to encode the output with %s encoding. Unsupported characters are discarded.",
+                               out_file.encoding)
+                self._encode_error_reported = True
             print(output.encode('ascii', 'ignore').decode('utf-8', 'ignore'),
                   file=out_file, end='')
 
+    @property
+    def formats(self):
+        """ The names of the registered output formats """
+        return list(self._formatters)
+
+    def register_format(self, name, formatter, streaming=None):
+        """ Register an output format that can be selected with --output.
+            Formats must be registered before the parser is created to appear in the --output choices.
+
+        :param name: The name of the format. An existing format with the same name is replaced.
+        :type name: str
+        :param formatter: The function that formats a command result, or its path in the form
+                          'package.module#function'. A path is only imported when the format is selected.
+        :type formatter: function or str
+        :param streaming: Whether the formatter returns an iterable of chunks instead of a string.
+                          If None, it is read from the `supports_streaming` attribute of the formatter once loaded,
+                          and is False if the formatter has no such attribute.
+        :type streaming: bool
+        """
+        if isinstance(formatter, str):
+            if '#' not in formatter:
+                raise ValueError("The formatter '{}' is invalid. "
+                                 "Expected the form 'package.module#function'.".format(formatter))
+        elif not callable(formatter):
+            raise TypeError('Expected a callable or str got {}'.format(type(formatter)))
+        self._formatters[name.lower()] = _FormatterInfo(formatter, streaming)
+
+    def register_entry_point_formats(self, group):
+        """ Register the output formats published by installed packages under an entry point group.
+            The name of each entry point is the name of the format. Formatters are only imported when selected.
+
+        :param group: The entry point group, e.g. 'mycli.output_formats'
+        :type group: str
+        """
+        from importlib.metadata import entry_points
+        eps = entry_points()
+        eps = eps.select(group=group) if hasattr(eps, 'select') else eps.get(group, [])
+        for ep in eps:
+            module, _, attr = ep.value.partition(':')
+            # Drop any extras, e.g. 'package.module:function [extra]'
+            attr = attr.split('[')[0].strip()
+            self.register_format(ep.name, '{}#{}'.format(module.strip(), attr))
+
+    def _get_formatter_info(self, format_type):
+        info = self._formatters[format_type]
+        if isinstance(info.formatter, str):
+            mod_to_import, attr_path = info.formatter.split('#')
+            try:
+                formatter = import_module(mod_to_import)
+                for part in attr_path.split('.'):
+                    formatter = getattr(formatter, part)
+            except (ImportError, AttributeError) as ex:
+                logger.debug(traceback.format_exc())
+                raise CLIError("Unable to load the '{}' output format from '{}'.".format(
+                    format_type, info.formatter)) from ex
+            info = _FormatterInfo(formatter, info.streaming)
+        if info.streaming is None:
+            info = _FormatterInfo(info.formatter, bool(getattr(info.formatter, 'supports_streaming', False)))
+        self._formatters[format_type] = info
+        return info
+
+    def _is_streaming(self, formatter):
+        for format_type, info in self._formatters.items():
+            if info.formatter is formatter:
+                return self._get_formatter_info(format_type).streaming
+        # The formatter is not registered, e.g. when it is passed to out() directly
+        return bool(getattr(formatter, 'supports_streaming', False))
+
+    def supports_streaming(self, format_type):
+        """ Whether the formatter of the output format produces its output in chunks
+
+        :param format_type: The name of the output format
+        :type format_type: str
+        """
+        formatter = self._get_formatter_info(format_type).formatter
+        return self._is_streaming(_CHUNK_FORMATTERS.get(formatter, formatter))
+
     def get_formatter(self, format_type):
         # remove color if stdout is not a tty
         if not self.cli_ctx.enable_color and format_type == 'jsonc':
-            return OutputProducer._FORMAT_DICT['json']
+            format_type = 'json'
         if not self.cli_ctx.enable_color and format_type == 'yamlc':
-            return OutputProducer._FORMAT_DICT['yaml']
-        return OutputProducer._FORMAT_DICT[format_type]
+            format_type = 'yaml'
+        return self._get_formatter_info(format_type).formatter
+
+
+def _get_size(chunk):
+    """ The number of bytes of a chunk of output once it is written """
+    return len(chunk) if isinstance(chunk, bytes) or chunk.isascii() else len(chunk.encode('utf-8'))
+
+
+class _OutputLimiter(object):
+    """ Truncates the output of a formatter to a number of bytes, optionally spilling the whole output to a file """
+
+    def __init__(self, max_bytes, spill_file=None):
+        self.max_bytes = max_bytes
+        self.spill_file = spill_file
+        self.spill_path = spill_file.name if spill_file else None
+        # Produces the output of the items that were truncated, to spill after the output of the kept items
+        self.spill_rest = None
+        self.truncated_items = None
+        self.truncated_bytes = False
+
+    def spill(self, chunks):
+        for chunk in chunks:
+            self.spill_file.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+
+    def iter_chunks(self, chunks):
+        chunks = iter(chunks)
+        try:
+            yield from self._iter_limited_chunks(chunks)
+            if self.spill_file:
+                # Only the spill file needs the rest of the output
+                self.spill(chunks)
+                if self.spill_rest:
+                    self.spill(self.spill_rest())
+        finally:
+            # Stop the formatter once the output is no longer needed
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _iter_limited_chunks(self, chunks):
+        remaining = self.max_bytes
+        # The text after the last newline, which is only written once the line is complete
+        pending = ''
+        for chunk in chunks:
+            if self.spill_file:
+                self.spill([chunk])
+            if remaining is None:
+                yield chunk
+                continue
+            if isinstance(chunk, str):
+                chunk, pending = pending + chunk, ''
+            chunk, remaining = self._truncate(chunk, remaining)
+            if isinstance(chunk, str) and not self.truncated_bytes:
+                end = chunk.rfind('\n') + 1
+                chunk, pending = chunk[:end], chunk[end:]
+                remaining += _get_size(pending)
+            if chunk:
+                yield chunk
+            if self.truncated_bytes:
+                return
+        if pending:
+            yield pending
+
+    def _truncate(self, chunk, remaining):
+        """ Cut the chunk to the complete lines, or the complete length-prefixed frames of binary output, that fit
+        in the remaining number of bytes. Returns the chunk and the number of bytes left. """
+        size = _get_size(chunk)
+        if size <= remaining:
+            return chunk, remaining - size
+        self.truncated_bytes = True
+        if isinstance(chunk, bytes):
+            end = 0
+            while end + 4 <= remaining:
+                frame_end = end + 4 + struct.unpack('>I', chunk[end:end + 4])[0]
+                if frame_end > remaining:
+                    break
+                end = frame_end
+            return chunk[:end], 0
+        chunk = chunk.encode('utf-8')[:remaining].decode('utf-8', 'ignore')
+        return chunk[:chunk.rfind('\n') + 1], 0
+
+    def close(self):
+        if self.spill_file:
+            self.spill_file.close()
+
+    def report(self):
+        if self.truncated_items:
+            logger.warning("The output was truncated to the first %d of %d items.", *self.truncated_items)
+        if self.truncated_bytes:
+            logger.warning("The output was truncated to %d bytes.", self.max_bytes)
+        if self.spill_path and (self.truncated_items or self.truncated_bytes):
+            logger.warning("The full output was written to %s", self.spill_path)
+        elif self.spill_path:
+            import os
+            os.remove(self.spill_path)
 
 
 class _TableOutput(object):  # pylint: disable=too-few-public-methods
@@ -213,56 +846,90 @@ class _TableOutput(object):  # pylint: disable=too-few-public-methods
         return table_str + '\n'
 
 
-class _TsvOutput(object):  # pylint: disable=too-few-public-methods
+def _format_cell(value):
+    if isinstance(value, list):
+        return str(len(value))
+    if isinstance(value, dict):
+        # We need to print something to avoid mismatching
+        # number of columns if the value is None for some instances
+        # and a dictionary value in other...
+        return ''
+    return value if isinstance(value, str) else str(value)
 
-    @staticmethod
-    def _dump_obj(data, stream):
-        if isinstance(data, list):
-            stream.write(str(len(data)))
-        elif isinstance(data, dict):
-            # We need to print something to avoid mismatching
-            # number of columns if the value is None for some instances
-            # and a dictionary value in other...
-            stream.write('')
-        else:
-            to_write = data if isinstance(data, str) else str(data)
-            stream.write(to_write)
 
-    @staticmethod
-    def _dump_row(data, stream):
-        separator = ''
-        if isinstance(data, (dict, list)):
-            if isinstance(data, OrderedDict):
-                values = data.values()
-            elif isinstance(data, dict):
-                values = [value for _, value in sorted(data.items())]
-            else:
-                values = data
-
-            # Iterate through the items either sorted by key value (if dict) or in the order
-            # they were added (in the cases of an ordered dict) in order to make the output
-            # stable
-            for value in values:
-                stream.write(separator)
-                _TsvOutput._dump_obj(value, stream)
-                separator = '\t'
-        elif isinstance(data, list):
-            for value in data:
-                stream.write(separator)
-                _TsvOutput._dump_obj(value, stream)
-                separator = '\t'
-        elif isinstance(data, bool):
-            _TsvOutput._dump_obj(str(data).lower(), stream)
-        else:
-            _TsvOutput._dump_obj(data, stream)
-        stream.write('\n')
+class _ColumnarOutput(object):  # pylint: disable=too-few-public-methods
 
-    @staticmethod
-    def dump(data):
-        io = StringIO()
-        for item in data:
-            _TsvOutput._dump_row(item, io)
-
-        result = io.getvalue()
-        io.close()
-        return result
+    def __init__(self, delimiter, quoting=None, columns=None):
+        """ Writes the items of a result as rows of delimited values
+
+        :param delimiter: The string that separates the values of a row
+        :type delimiter: str
+        :param quoting: The csv quoting of the values, e.g. csv.QUOTE_MINIMAL. Quoted output starts with a header row
+                        of the columns, which are the keys of the first item unless they are given. If None, the
+                        values of each item are written as they are, without a header.
+        :type quoting: int
+        :param columns: The keys of the values to write for each dict item when quoting
+        :type columns: list
+        """
+        self.delimiter = delimiter
+        self.quoting = quoting
+        self.columns = columns
+        # Sorted key order of each set of dict keys seen so far, so rows with the same keys are only sorted once
+        self._key_orders = {}
+
+    def _get_values(self, data):
+        # Iterate through the items either sorted by key value (if dict) or in the order
+        # they were added (in the cases of an ordered dict) in order to make the output
+        # stable
+        if isinstance(data, OrderedDict) or not isinstance(data, dict):
+            return data.values() if isinstance(data, dict) else data
+        keys = tuple(data)
+        key_order = self._key_orders.get(keys)
+        if key_order is None:
+            key_order = self._key_orders[keys] = itemgetter(*sorted(keys)) if keys else lambda _: ()
+        values = key_order(data)
+        return values if len(keys) != 1 else (values,)
+
+    def _format_cell(self, value):
+        if isinstance(value, str):
+            return value
+        if self.quoting is not None:
+            if value is None:
+                return ''
+            if isinstance(value, bool):
+                return str(value).lower()
+        return _format_cell(value)
+
+    def _get_row(self, data):
+        if isinstance(data, dict) and self.columns is not None:
+            return [self._format_cell(data.get(column)) for column in self.columns]
+        if isinstance(data, (dict, list)):
+            return [self._format_cell(value) for value in self._get_values(data)]
+        if isinstance(data, bool):
+            return [str(data).lower()]
+        return [self._format_cell(data)]
+
+    def iter_dump(self, data):
+        """ Yield the rows of the items of the list in chunks """
+        if self.quoting is None:
+            delimiter = self.delimiter
+            for start in range(0, len(data), STREAMING_CHUNK_SIZE):
+                yield ''.join([delimiter.join(self._get_row(item)) + '\n'
+                               for item in data[start:start + STREAMING_CHUNK_SIZE]])
+            return
+
+        import csv
+        buffer = StringIO()
+        writer = csv.writer(buffer, delimiter=self.delimiter, quoting=self.quoting, lineterminator='\n')
+        if self.columns is None and data and isinstance(data[0], dict):
+            # Like TSV, dict keys are sorted unless their order was specified (e.g. with --query)
+            self.columns = list(data[0]) if isinstance(data[0], OrderedDict) else sorted(data[0])
+        if self.columns:
+            writer.writerow(self.columns)
+        for start in range(0, len(data), STREAMING_CHUNK_SIZE):
+            writer.writerows(self._get_row(item) for item in data[start:start + STREAMING_CHUNK_SIZE])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if not data:
+            yield buffer.getvalue()
@@ -4,6 +4,8 @@
 # --------------------------------------------------------------------------------------------
 
 import argparse
+import os
+from functools import lru_cache
 
 from .deprecation import Deprecated
 from .events import EVENT_PARSER_GLOBAL_CREATE
@@ -30,7 +32,317 @@ ARGPARSE_SUPPORTED_KWARGS = [
 ]
 
 
-class CLICommandParser(argparse.ArgumentParser):
+# The ways arguments with a file_mode receive their '@'-prefixed files
+FILE_MODES = ['stream', 'binary', 'mmap']
+
+# The maximum number of '@'-prefixed files that are read concurrently
+MAX_FILE_READERS = 4
+
+# The maximum size in bytes of the '@'-prefixed files that are read before the options of the command are known.
+# Larger files may belong to arguments with a file_mode, which must not be read into memory.
+MAX_PREFETCH_FILE_SIZE = 1024 * 1024
+
+
+def _read_prefixed_file(path):
+    """ Read the file of an '@'-prefixed argument as string, or return None if it can't be opened """
+    try:
+        logger.debug('Attempting to read file %s', path)
+        # Use the default system encoding: https://docs.python.org/3/library/functions.html#open
+        with open(path, 'r') as f:  # pylint: disable=unspecified-encoding
+            return f.read()
+    except IOError:
+        logger.debug('File Error: Failed to open %s, assume not a file', path)
+        return None
+
+
+def _prefetch_prefixed_file(path):
+    """ Read the file of an '@'-prefixed argument like `_read_prefixed_file`, unless it is larger than
+    MAX_PREFETCH_FILE_SIZE, in which case _NOT_PREFETCHED is returned """
+    try:
+        if os.path.getsize(path) > MAX_PREFETCH_FILE_SIZE:
+            logger.debug('File %s is too large to prefetch', path)
+            return _NOT_PREFETCHED
+    except OSError:
+        pass
+    return _read_prefixed_file(path)
+
+
+_NOT_PREFETCHED = object()
+
+
+def _create_file_reader(file_count):
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=min(file_count, MAX_FILE_READERS), thread_name_prefix='knack-file')
+
+
+class _FileArgumentType(object):  # pylint: disable=too-few-public-methods
+    """ Converts an '@'-prefixed value to a file without reading it. Other values are passed to the argument type. """
+
+    def __init__(self, file_mode, encoding=None, value_type=None):
+        self.file_mode = file_mode
+        self.encoding = encoding
+        self.value_type = value_type
+        # argparse uses the name of the type in its error messages
+        self.__name__ = getattr(value_type, '__name__', 'file')
+
+    def __call__(self, value):
+        import os
+        if value.startswith('@') and os.path.isfile(value[1:]):
+            path = value[1:]
+            logger.debug('Using file %s in %s mode', path, self.file_mode)
+            if self.file_mode == 'mmap':
+                import mmap
+                with open(path, 'rb') as f:
+                    try:
+                        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    except ValueError:
+                        # Empty files can't be mapped
+                        return b''
+            from .util import LazyFile
+            if self.file_mode == 'binary':
+                return LazyFile(path, 'rb')
+            return LazyFile(path, 'r', encoding=self.encoding)
+        return self.value_type(value) if self.value_type else value
+
+
+class _SuggestionIndex(object):
+    """ Finds the names that are similar to a mistyped name. The names are grouped by length and their characters
+    are counted up front, so that only the names with a length and enough shared characters to be similar are
+    compared with difflib. """
+
+    def __init__(self, names):
+        from collections import Counter, defaultdict
+        self.names = list(names)
+        self._char_counts = [Counter(name) for name in self.names]
+        self._positions_by_length = defaultdict(list)
+        for position, name in enumerate(self.names):
+            self._positions_by_length[len(name)].append(position)
+
+    def get_close_matches(self, word, n=3, cutoff=0.7):
+        """ Get the same matches as difflib.get_close_matches over all the names
+
+        :param word: The mistyped name
+        :type word: str
+        :param n: The maximum number of matches
+        :type n: int
+        :param cutoff: The minimum similarity of a match, between 0 and 1
+        :type cutoff: float
+        :return: The matches, the most similar first
+        :rtype: list
+        """
+        import difflib
+        from collections import Counter
+        word_counts = Counter(word).items()
+        candidates = []
+        # The same bounds of the similarity as difflib.SequenceMatcher.real_quick_ratio and quick_ratio
+        for length, positions in self._positions_by_length.items():
+            total = len(word) + length
+            if not total:
+                candidates.extend(self.names[position] for position in positions)
+                continue
+            if 2.0 * min(len(word), length) / total < cutoff:
+                continue
+            for position in positions:
+                char_counts = self._char_counts[position]
+                matches = 0
+                for char, count in word_counts:
+                    name_count = char_counts.get(char)
+                    if name_count:
+                        matches += count if count < name_count else name_count
+                if 2.0 * matches / total >= cutoff:
+                    candidates.append(self.names[position])
+        return difflib.get_close_matches(word, candidates, n, cutoff)
+
+
+@lru_cache(maxsize=32)
+def _get_suggestion_index(names):
+    # The index is reused by the invocations of a CLI with the same commands
+    return _SuggestionIndex(names)
+
+
+# The hashes of the names that were looked up once without an index
+_suggestion_lookups = set()
+
+
+def _get_close_matches(names, word, cutoff=0.7):
+    """ Get the names that are similar to a mistyped name. Building the index of the names takes longer than a
+    single lookup with difflib, so the index is only built once the same names are looked up again, e.g. by the
+    invocations of a resident CLI or for another mistyped name. """
+    import difflib
+    names = tuple(names)
+    names_hash = hash(names)
+    if names_hash in _suggestion_lookups:
+        return _get_suggestion_index(names).get_close_matches(word, cutoff=cutoff)
+    if len(_suggestion_lookups) >= 1024:
+        _suggestion_lookups.clear()
+    _suggestion_lookups.add(names_hash)
+    return difflib.get_close_matches(word, names, cutoff=cutoff)
+
+
+# The action classes whose arguments the fast parser applies itself, see `_FastCommandParser`
+# pylint: disable=protected-access
+_FAST_PARSER_ACTIONS = (argparse.Action, argparse._StoreAction, argparse._StoreConstAction,
+                        argparse._StoreTrueAction, argparse._StoreFalseAction)
+# pylint: enable=protected-access
+
+
+def _is_fast_parser_action(action):
+    action_class = type(action)
+    # Look through the classes that record the status tag of an argument before acting like their parent class
+    while '_status_tag_kind' in vars(action_class):
+        action_class = action_class.__bases__[0]
+    return action_class in _FAST_PARSER_ACTIONS
+
+
+def _set_parser_defaults(parser, namespace):
+    # The defaults that argparse.ArgumentParser.parse_known_args adds to the namespace before parsing
+    for action in parser._actions:  # pylint: disable=protected-access
+        if action.dest is not argparse.SUPPRESS and action.default is not argparse.SUPPRESS \
+                and not hasattr(namespace, action.dest):
+            setattr(namespace, action.dest, action.default)
+    for dest, value in parser._defaults.items():  # pylint: disable=protected-access
+        if not hasattr(namespace, dest):
+            setattr(namespace, dest, value)
+
+
+def _convert_parser_defaults(parser, namespace, seen_actions):
+    # Like argparse, convert the string defaults of the arguments that weren't given
+    for action in parser._actions:  # pylint: disable=protected-access
+        if action not in seen_actions and isinstance(action.default, str) and hasattr(namespace, action.dest) \
+                and action.default is getattr(namespace, action.dest):
+            value = parser._get_value(action, action.default)  # pylint: disable=protected-access
+            setattr(namespace, action.dest, value)
+
+
+class _FastParseDeferred(Exception):
+    """ The arguments need to be parsed by argparse """
+
+
+class _FastCommandParser(object):
+    """ Parses the arguments of a command by looking up its option strings in a table, instead of argparse's pattern
+    matching. It handles options that store their values, with any nargs, type and choices, and produces the same
+    namespace as argparse. Anything else, including a missing required argument, is left to argparse before any
+    value is converted. Invalid values are reported the way argparse reports them. """
+
+    def __init__(self, levels, command_parser):
+        """
+        :param levels: The parser, subparsers action and chosen name of each level above the command
+        :type levels: list
+        :param command_parser: The parser of the command
+        :type command_parser: knack.parser.CLICommandParser
+        """
+        self.levels = levels
+        self.command_parser = command_parser
+        self.supported = command_parser.prefix_chars == '-' and not command_parser.fromfile_prefix_chars \
+            and not command_parser._mutually_exclusive_groups  # pylint: disable=protected-access
+        self.options = {}
+        for action in command_parser._actions:  # pylint: disable=protected-access
+            if not action.option_strings:
+                # positional arguments
+                self.supported = False
+            for option_string in action.option_strings:
+                self.options[option_string] = action if _is_fast_parser_action(action) else None
+
+    def parse_args(self, arg_strings):
+        """ Parse the arguments that follow the command name
+
+        :param arg_strings: The arguments after the command name
+        :type arg_strings: list
+        :return: The namespace, or None if argparse needs to parse the arguments
+        :rtype: argparse.Namespace
+        """
+        try:
+            options = self._find_options(arg_strings)
+        except _FastParseDeferred:
+            return None
+        seen_actions = {action for action, _, _ in options}
+        if any(action.required for action in self.command_parser._actions  # pylint: disable=protected-access
+               if action not in seen_actions):
+            return None
+
+        # The values are only converted once argparse is known not to be needed, so that the types and actions
+        # never run twice. Errors are then reported like argparse reports them.
+        command_namespace = argparse.Namespace()
+        _set_parser_defaults(self.command_parser, command_namespace)
+        get_values = self.command_parser._get_values  # pylint: disable=protected-access
+        try:
+            for action, option_string, values in options:
+                action(self.command_parser, command_namespace, get_values(action, values), option_string)
+            _convert_parser_defaults(self.command_parser, command_namespace, seen_actions)
+        except argparse.ArgumentError as ex:
+            self.command_parser.error(str(ex))
+
+        # Each level parses what follows into a new namespace and copies it into its own, like
+        # argparse._SubParsersAction does
+        namespaces = []
+        for parser, subparsers_action, name in self.levels:
+            namespace = argparse.Namespace()
+            _set_parser_defaults(parser, namespace)
+            setattr(namespace, subparsers_action.dest, name)
+            namespaces.append(namespace)
+        namespaces.append(command_namespace)
+        for index in range(len(self.levels) - 1, -1, -1):
+            namespace = namespaces[index]
+            for key, value in vars(namespaces[index + 1]).items():
+                setattr(namespace, key, value)
+            parser, subparsers_action, _ = self.levels[index]
+            try:
+                _convert_parser_defaults(parser, namespace, {subparsers_action})
+            except argparse.ArgumentError as ex:
+                parser.error(str(ex))
+        return namespaces[0]
+
+    def _find_options(self, arg_strings):
+        """ Find the action, option string and values of each option, without converting the values """
+        options = []
+        index = 0
+        while index < len(arg_strings):
+            option_string, explicit_arg = arg_strings[index], None
+            index += 1
+            if option_string not in self.options and '=' in option_string:
+                option_string, explicit_arg = option_string.split('=', 1)
+            # Unknown and abbreviated options, positional values, '--' and unsupported actions
+            action = self.options.get(option_string)
+            if action is None:
+                raise _FastParseDeferred()
+            if explicit_arg is not None:
+                if action.nargs not in (None, argparse.OPTIONAL):
+                    raise _FastParseDeferred()
+                values = [explicit_arg]
+            else:
+                count = 0
+                while index + count < len(arg_strings) and not arg_strings[index + count].startswith('-'):
+                    count += 1
+                values = arg_strings[index:index + self._get_arg_count(action, count)]
+                index += len(values)
+            options.append((action, option_string, values))
+        return options
+
+    @staticmethod
+    def _get_arg_count(action, available):
+        nargs = action.nargs
+        if nargs is None:
+            required = 1
+        elif nargs == argparse.OPTIONAL:
+            return min(available, 1)
+        elif nargs == argparse.ZERO_OR_MORE:
+            return available
+        elif nargs == argparse.ONE_OR_MORE:
+            required = max(available, 1)
+        elif isinstance(nargs, int):
+            required = nargs
+        else:
+            raise _FastParseDeferred()
+        if available < required:
+            raise _FastParseDeferred()
+        return required
+
+
+class _DeprecatedOption(str):
+    """ An option string that carries the deprecate_info of a deprecated option """
+
+
+class CLICommandParser(argparse.ArgumentParser):  # pylint: disable=too-many-instance-attributes
 
     @staticmethod
     def create_global_parser(cli_ctx=None):
@@ -43,6 +355,12 @@ class CLICommandParser(argparse.ArgumentParser):
     def _add_argument(obj, arg):
         """ Only pass valid argparse kwargs to argparse.ArgumentParser.add_argument """
         argparse_options = {name: value for name, value in arg.options.items() if name in ARGPARSE_SUPPORTED_KWARGS}
+        if arg.file_mode:
+            if arg.file_mode not in FILE_MODES:
+                raise ValueError("The file_mode '{}' of argument '{}' is invalid. Allowed values: {}.".format(
+                    arg.file_mode, arg.name, ', '.join(FILE_MODES)))
+            argparse_options['type'] = _FileArgumentType(arg.file_mode, arg.file_encoding,
+                                                         argparse_options.get('type'))
         if arg.options_list:
             scrubbed_options_list = []
             for item in arg.options_list:
@@ -52,11 +370,6 @@ class CLICommandParser(argparse.ArgumentParser):
                     if item.expired():
                         continue
 
-                    class _DeprecatedOption(str):
-                        def __new__(cls, *args, **kwargs):
-                            instance = str.__new__(cls, *args, **kwargs)
-                            return instance
-
                     option = _DeprecatedOption(item.target)
                     setattr(option, 'deprecate_info', item)
                     item = option
@@ -70,25 +383,69 @@ class CLICommandParser(argparse.ArgumentParser):
         return obj.add_argument(**argparse_options)
 
     @staticmethod
-    def _expand_prefixed_files(args):
-        """ Load arguments prefixed with '@' from file as string
+    def _expand_prefixed_files(args, skip_options=None, prefetched_files=None):
+        """ Load arguments prefixed with '@' from file as string. Multiple files are read concurrently.
 
         :param args: Arguments passed from command line
         :type args: list
+        :param skip_options: Option strings whose values are not loaded, as their arguments open the files themselves
+        :type skip_options: set
+        :param prefetched_files: The futures of files that are already being read, by path
+        :type prefetched_files: dict
         """
-        for arg, _ in enumerate(args):
-            if args[arg].startswith('@'):
-                try:
-                    logger.debug('Attempting to read file %s', args[arg][1:])
-                    # Use the default system encoding: https://docs.python.org/3/library/functions.html#open
-                    with open(args[arg][1:], 'r') as f:  # pylint: disable=unspecified-encoding
-                        content = f.read()
-                    args[arg] = content
-                except IOError:
-                    # Leave arg unmodified
-                    logger.debug('File Error: Failed to open %s, assume not a file', args[arg][1:])
+        indexes = CLICommandParser._find_prefixed_files(args, skip_options)
+        prefetched_files = prefetched_files or {}
+        paths = list(dict.fromkeys(args[index][1:] for index in indexes if args[index][1:] not in prefetched_files))
+        if len(paths) > 1:
+            with _create_file_reader(len(paths)) as executor:
+                contents = dict(zip(paths, executor.map(_read_prefixed_file, paths)))
+        else:
+            contents = {path: _read_prefixed_file(path) for path in paths}
+        for index in indexes:
+            path = args[index][1:]
+            if path not in contents:
+                content = prefetched_files[path].result()
+                contents[path] = _read_prefixed_file(path) if content is _NOT_PREFETCHED else content
+            content = contents[path]
+            # Leave arg unmodified if the file couldn't be read
+            if content is not None:
+                args[index] = content
         return args
 
+    @staticmethod
+    def _find_prefixed_files(args, skip_options=None):
+        """ Get the indexes of the arguments prefixed with '@' that are not values of the skipped options """
+        indexes = []
+        option = None
+        for index, arg in enumerate(args):
+            if not isinstance(arg, str):
+                continue
+            if arg.startswith('-'):
+                # The values that follow belong to this option
+                option = arg
+            elif arg.startswith('@') and not (skip_options and option in skip_options):
+                indexes.append(index)
+        return indexes
+
+    def prefetch_prefixed_files(self, args):
+        """ Start reading the files of the arguments prefixed with '@' in the background, e.g. while the command
+        table is loaded. `parse_args` then uses the contents that were read.
+        The options of the command are not known yet, so the values of the options with a file_mode in any command
+        loaded so far are skipped, and files larger than MAX_PREFETCH_FILE_SIZE are left to be read by `parse_args`
+        if their argument has no file_mode.
+
+        :param args: Arguments passed from command line
+        :type args: list
+        """
+        skip_options = set().union(*self._file_mode_options.values())
+        paths = {args[index][1:] for index in self._find_prefixed_files(args, skip_options)}
+        if not paths:
+            return
+        executor = _create_file_reader(len(paths))
+        self._prefetched_files = {path: executor.submit(_prefetch_prefixed_file, path) for path in paths}
+        # The files that were submitted are still read
+        executor.shutdown(wait=False)
+
     def __init__(self, cli_ctx=None, cli_help=None, **kwargs):
         """ Create the argument parser
 
@@ -102,6 +459,12 @@ class CLICommandParser(argparse.ArgumentParser):
         self.cli_ctx = cli_ctx
         self.cli_help = cli_help
         self.subparsers = {}
+        # The option strings of the arguments with a file_mode, by command name
+        self._file_mode_options = {}
+        self._prefetched_files = None
+        # The parsers of the commands by name, and the fast parsers created for them
+        self._command_parsers = {}
+        self._fast_parsers = {}
         self.parents = kwargs.get('parents', [])
         self.help_file = kwargs.pop('help_file', None)
         # We allow a callable for description to be passed in in order to delay-load any help
@@ -126,6 +489,7 @@ class CLICommandParser(argparse.ArgumentParser):
             sp = self.add_subparsers(dest='_command')
             sp.required = True
             self.subparsers = {(): sp}
+        self._fast_parsers.clear()
 
         for command_name, metadata in cmd_tbl.items():
             subparser = self._get_subparser(command_name.split(), grp_tbl)
@@ -147,8 +511,10 @@ class CLICommandParser(argparse.ArgumentParser):
                                                   formatter_class=fc,
                                                   cli_help=self.cli_help)
             command_parser.cli_ctx = self.cli_ctx
+            self._command_parsers[command_name] = command_parser
             command_validator = metadata.validator
             argument_validators = []
+            argument_validator_dests = []
             argument_groups = {}
             for arg in metadata.arguments.values():
 
@@ -159,6 +525,7 @@ class CLICommandParser(argparse.ArgumentParser):
 
                 if arg.validator:
                     argument_validators.append(arg.validator)
+                    argument_validator_dests.append(arg.options['dest'])
                 if arg.arg_group:
                     try:
                         group = argument_groups[arg.arg_group]
@@ -175,11 +542,14 @@ class CLICommandParser(argparse.ArgumentParser):
                 param.preview_info = arg.preview_info
                 param.experimental_info = arg.experimental_info
                 param.default_value_source = arg.default_value_source
+                if arg.file_mode:
+                    self._file_mode_options.setdefault(command_name, set()).update(param.option_strings)
             command_parser.set_defaults(
                 func=metadata,
                 command=command_name,
                 _command_validator=command_validator,
                 _argument_validators=argument_validators,
+                _argument_validator_dests=argument_validator_dests,
                 _parser=command_parser)
 
     def _get_subparser(self, path, group_table=None):
@@ -257,13 +627,87 @@ class CLICommandParser(argparse.ArgumentParser):
         Enables '@'-prefixed files to be expanded before arguments are processed
         by ArgumentParser.parse_args as usual
         """
-        self._expand_prefixed_files(args)
-        return super().parse_args(args)
+        prefetched_files, self._prefetched_files = self._prefetched_files, None
+        self._expand_prefixed_files(args, self._get_file_mode_options(args), prefetched_files)
+        for future in (prefetched_files or {}).values():
+            # Don't read the files that weren't used, if it hasn't started
+            future.cancel()
+        if args and self.cli_ctx and self.cli_ctx.config.getboolean('core', 'fast_parser', fallback=False):
+            namespace = self._fast_parse_args(args)
+            if namespace is not None:
+                return namespace
+        namespace, extras = self.parse_known_args(args)
+        if extras:
+            self.error(self._get_unrecognized_arguments_message(namespace, extras))
+        return namespace
+
+    @staticmethod
+    def _get_unrecognized_arguments_message(namespace, extras):
+        message = 'unrecognized arguments: {}'.format(' '.join(extras))
+        command_parser = getattr(namespace, '_parser', None)
+        if command_parser is None:
+            return message
+        # Suggest the options of the command that are similar to the mistyped ones
+        option_strings = tuple(command_parser._option_string_actions)  # pylint: disable=protected-access
+        for extra in extras:
+            if not extra.startswith('-'):
+                continue
+            candidates = _get_close_matches(option_strings, extra.split('=', 1)[0], cutoff=0.7)
+            if candidates:
+                message += "\nThe most similar choices to '{}':\n".format(extra)
+                message += '\n'.join(['\t' + candidate for candidate in candidates])
+        return message
+
+    def _fast_parse_args(self, args):
+        """ Parse the arguments of a command with its fast parser, or return None if argparse needs to parse them """
+        command_words = []
+        for arg in args:
+            if arg.startswith('-'):
+                break
+            command_words.append(arg)
+        command_name = ' '.join(command_words)
+        if command_name not in self._command_parsers:
+            # e.g. options before the command name, positional arguments or an unknown command
+            return None
+        try:
+            fast_parser = self._fast_parsers[command_name]
+        except KeyError:
+            fast_parser = self._fast_parsers[command_name] = self._create_fast_parser(command_words)
+        return fast_parser.parse_args(args[len(command_words):]) if fast_parser else None
+
+    def _create_fast_parser(self, command_words):
+        levels = []
+        parser = self
+        for index, word in enumerate(command_words):
+            subparsers_action = self.subparsers.get(tuple(command_words[:index]))
+            # pylint: disable=protected-access
+            parser_map = subparsers_action._name_parser_map if subparsers_action else {}
+            if word not in parser_map:
+                return None
+            levels.append((parser, subparsers_action, word))
+            parser = parser_map[word]
+        if parser is not self._command_parsers[' '.join(command_words)]:
+            return None
+        fast_parser = _FastCommandParser(levels, parser)
+        return fast_parser if fast_parser.supported else None
+
+    def _get_file_mode_options(self, args):
+        if not self._file_mode_options or not args:
+            return None
+        command_words = []
+        for arg in args:
+            if arg.startswith('-'):
+                break
+            command_words.append(arg)
+        for length in range(len(command_words), 0, -1):
+            options = self._file_mode_options.get(' '.join(command_words[:length]))
+            if options is not None:
+                return options
+        return None
 
     def _check_value(self, action, value):
         # Override to customize the error message when a argument is not among the available choices
         # converted value must be one of the choices (if specified)
-        import difflib
         import sys
 
         if action.choices is not None and value not in action.choices:
@@ -273,7 +717,7 @@ class CLICommandParser(argparse.ArgumentParser):
                     prog=self.prog, value=value)
                 logger.error(error_msg)
                 # Show suggestions
-                candidates = difflib.get_close_matches(value, action.choices, cutoff=0.7)
+                candidates = _get_close_matches(action.choices, value, cutoff=0.7)
                 if candidates:
                     suggestion_msg = "\nThe most similar choices to '{value}':\n".format(value=value)
                     suggestion_msg += '\n'.join(['\t' + candidate for candidate in candidates])
@@ -4,10 +4,27 @@
 # --------------------------------------------------------------------------------------------
 
 import collections
+from functools import lru_cache
 
 from .events import (EVENT_PARSER_GLOBAL_CREATE, EVENT_INVOKER_POST_PARSE_ARGS,
                      EVENT_INVOKER_FILTER_RESULT)
-from .util import CtxTypeError
+from .util import CtxTypeError, LazyDict
+
+
+@lru_cache(maxsize=None)
+def _get_query_functions():
+    from jmespath import functions
+
+    class _QueryFunctions(functions.Functions):
+        """ Let JMESPath functions that take objects accept the lazily converted results. """
+
+        def _get_allowed_pytypes(self, types):
+            allowed_types, allowed_subtypes = super()._get_allowed_pytypes(types)
+            if 'dict' in allowed_types:
+                allowed_types.append(LazyDict.__name__)
+            return allowed_types, allowed_subtypes
+
+    return _QueryFunctions()
 
 
 class CLIQuery(object):
@@ -40,12 +57,12 @@ class CLIQuery(object):
         query_expression = args._jmespath_query  # pylint: disable=protected-access
         del args._jmespath_query
         if query_expression:
-            def filter_output(cli_ctx, **kwargs):
+            def filter_output(_, **kwargs):
                 from jmespath import Options
                 kwargs['event_data']['result'] = query_expression.search(
-                    kwargs['event_data']['result'], Options(collections.OrderedDict))
-                cli_ctx.unregister_event(EVENT_INVOKER_FILTER_RESULT, filter_output)
-            cli_ctx.register_event(EVENT_INVOKER_FILTER_RESULT, filter_output)
+                    kwargs['event_data']['result'],
+                    Options(collections.OrderedDict, custom_functions=_get_query_functions()))
+            cli_ctx.register_event(EVENT_INVOKER_FILTER_RESULT, filter_output, once=True, invocation_scoped=True)
             cli_ctx.invocation.data['query_active'] = True
 
     def __init__(self, cli_ctx=None):
@@ -6,8 +6,10 @@
 import errno
 import os
 import re
+from collections import OrderedDict
 from datetime import date, time, datetime, timedelta
 from enum import Enum
+from functools import lru_cache
 
 NO_COLOR_VARIABLE_NAME = 'KNACK_NO_COLOR'
 
@@ -130,30 +132,340 @@ def to_snake_case(s):
     return re.sub('([a-z0-9])([A-Z])', r'\1_\2', s1).lower()
 
 
-def todict(obj, post_processor=None):  # pylint: disable=too-many-return-statements
+_to_camel_case_cached = lru_cache(maxsize=4096)(to_camel_case)
+
+# Kinds of conversion applied by todict, resolved once per type
+_TODICT_DICT = 'dict'
+_TODICT_LIST = 'list'
+_TODICT_ENUM = 'enum'
+_TODICT_ISOFORMAT = 'isoformat'
+_TODICT_STR = 'str'
+_TODICT_ASDICT = 'asdict'
+_TODICT_OBJECT = 'object'
+_TODICT_NONE = 'none'
+
+_TODICT_JSON_SCALARS = frozenset([str, int, float, bool, type(None)])
+# The kind of conversion of each type. Types created at runtime (e.g. by namedtuple) would make the cache grow
+# without bound, so types aren't added once it's full.
+_TODICT_KINDS_MAX_SIZE = 1024
+_todict_kinds = {}
+
+
+def _get_todict_kind(obj):  # pylint: disable=too-many-return-statements
+    obj_type = type(obj)
+    kind = _todict_kinds.get(obj_type)
+    if kind:
+        return kind
+    if isinstance(obj, dict):
+        kind = _TODICT_DICT
+    elif isinstance(obj, list):
+        kind = _TODICT_LIST
+    elif isinstance(obj, Enum):
+        kind = _TODICT_ENUM
+    elif isinstance(obj, (date, time, datetime)):
+        kind = _TODICT_ISOFORMAT
+    elif isinstance(obj, timedelta):
+        kind = _TODICT_STR
+    elif hasattr(obj, '_asdict'):
+        kind = _TODICT_ASDICT
+    elif hasattr(obj, '__dict__'):
+        kind = _TODICT_OBJECT
+    else:
+        kind = _TODICT_NONE
+    if len(_todict_kinds) < _TODICT_KINDS_MAX_SIZE:
+        _todict_kinds[obj_type] = kind
+    return kind
+
+
+class _ToDictConverter(object):  # pylint: disable=too-few-public-methods
+
+    def __init__(self, post_processor, max_depth, max_items, keep_order=False):
+        self.post_processor = post_processor
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.keep_order = keep_order
+        self.item_count = 0
+        # ids of the containers being converted, to detect circular references
+        self.path = set()
+
+    def _enter(self, obj, depth):
+        if self.max_depth is not None and depth > self.max_depth:
+            raise ValueError('Unable to convert the object: it is nested more than {} levels deep.'.format(
+                self.max_depth))
+        if self.max_items is not None:
+            self.item_count += len(obj)
+            if self.item_count > self.max_items:
+                raise ValueError('Unable to convert the object: it has more than {} items.'.format(self.max_items))
+        if id(obj) in self.path:
+            raise ValueError('Unable to convert the object: circular reference detected.')
+        self.path.add(id(obj))
+
+    def convert(self, obj, depth=0):  # pylint: disable=too-many-return-statements, too-many-branches
+        # Exact types: subclasses of dict and list (e.g. OrderedDict) are copied to plain ones, unless the order
+        # of the OrderedDicts is kept
+        obj_type = type(obj)
+        if obj_type in _TODICT_JSON_SCALARS:
+            return obj
+        kind = _get_todict_kind(obj)
+        if kind is _TODICT_DICT:
+            self._enter(obj, depth)
+            dict_type = OrderedDict if self.keep_order and isinstance(obj, OrderedDict) else dict
+            # Only copy the dict once one of its values actually changes
+            result = None
+            for key, value in obj.items():
+                new_value = self.convert(value, depth + 1)
+                if new_value is not value:
+                    if result is None:
+                        result = dict_type(obj)
+                    result[key] = new_value
+            self.path.discard(id(obj))
+            if result is None:
+                result = obj if obj_type is dict_type and not self.post_processor else dict_type(obj)
+            return self.post_processor(obj, result) if self.post_processor else result
+        if kind is _TODICT_LIST:
+            self._enter(obj, depth)
+            result = None
+            for index, item in enumerate(obj):
+                new_item = self.convert(item, depth + 1)
+                if new_item is not item:
+                    if result is None:
+                        result = list(obj)
+                    result[index] = new_item
+            self.path.discard(id(obj))
+            if result is None:
+                result = obj if obj_type is list else list(obj)
+            return result
+        if kind is _TODICT_ENUM:
+            return obj.value
+        if kind is _TODICT_ISOFORMAT:
+            return obj.isoformat()
+        if kind is _TODICT_STR:
+            return str(obj)
+        if kind is _TODICT_ASDICT:
+            return self.convert(obj._asdict(), depth)
+        if kind is _TODICT_OBJECT:
+            attributes = obj.__dict__
+            self._enter(attributes, depth)
+            result = {_to_camel_case_cached(k): self.convert(v, depth + 1)
+                      for k, v in attributes.items()
+                      if not callable(v) and not k.startswith('_')}
+            self.path.discard(id(attributes))
+            return self.post_processor(obj, result) if self.post_processor else result
+        return obj
+
+
+def todict(obj, post_processor=None, max_depth=None, max_items=None):
     """
     Convert an object to a dictionary. Use 'post_processor(original_obj, dictionary)' to update the
-    dictionary in the process
+    dictionary in the process.
+
+    Dicts and lists that only contain JSON-native values are returned as they are instead of being copied,
+    unless a post_processor is given. The result can therefore share objects with the original object, and a
+    subtree found more than once in it is the same object each time. Copy the result before changing it in place.
+
+    :param max_depth: Raise ValueError if the object is nested deeper than this
+    :type max_depth: int
+    :param max_items: Raise ValueError if the object has more than this number of dict, list and attribute items
+    :type max_items: int
     """
-    if isinstance(obj, dict):
-        result = {k: todict(v, post_processor) for (k, v) in obj.items()}
-        return post_processor(obj, result) if post_processor else result
-    if isinstance(obj, list):
-        return [todict(a, post_processor) for a in obj]
-    if isinstance(obj, Enum):
-        return obj.value
-    if isinstance(obj, (date, time, datetime)):
-        return obj.isoformat()
-    if isinstance(obj, timedelta):
-        return str(obj)
-    if hasattr(obj, '_asdict'):
-        return todict(obj._asdict(), post_processor)
-    if hasattr(obj, '__dict__'):
-        result = {to_camel_case(k): todict(v, post_processor)
-                  for k, v in obj.__dict__.items()
-                  if not callable(v) and not k.startswith('_')}
-        return post_processor(obj, result) if post_processor else result
-    return obj
+    return _ToDictConverter(post_processor, max_depth, max_items).convert(obj)
+
+
+class LazyDict(dict):
+    """ A dict whose values are converted with `todict_lazy` when they are first accessed.
+
+    It is used to run queries over a command result without converting the parts of the result that the query
+    doesn't touch. Use `todict` to convert what is left once the result is no longer queried.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # keys of the values that haven't been converted yet
+        self._pending = set(self)
+
+    def _convert(self, key):
+        value = dict.__getitem__(self, key)
+        if key in self._pending:
+            value = todict_lazy(value)
+            dict.__setitem__(self, key, value)
+            self._pending.discard(key)
+        return value
+
+    def _convert_all(self):
+        for key in list(self._pending):
+            self._convert(key)
+
+    def __getitem__(self, key):
+        return self._convert(key)
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self._pending.discard(key)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self._pending.discard(key)
+
+    def __eq__(self, other):
+        self._convert_all()
+        if isinstance(other, LazyDict):
+            other._convert_all()  # pylint: disable=protected-access
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        self._convert_all()
+        return dict.__repr__(self)
+
+    def get(self, key, default=None):
+        return self._convert(key) if key in self else default
+
+    def pop(self, key, *args):
+        if key in self:
+            self._convert(key)
+        return dict.pop(self, key, *args)
+
+    def popitem(self):
+        self._convert_all()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self._convert(key)
+        self[key] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        other = args[0] if args else {}
+        for key, value in other.items() if hasattr(other, 'keys') else other:
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def items(self):
+        self._convert_all()
+        return dict.items(self)
+
+    def values(self):
+        self._convert_all()
+        return dict.values(self)
+
+    def copy(self):
+        self._convert_all()
+        result = LazyDict(self)
+        result._pending.clear()  # pylint: disable=protected-access
+        return result
+
+
+def todict_ordered(obj):
+    """
+    Convert an object like `todict`, but keep the OrderedDicts, e.g. those of a JMESPath multi-select, in their
+    order instead of copying them to plain dicts.
+    """
+    return _ToDictConverter(None, None, None, keep_order=True).convert(obj)
+
+
+def todict_lazy(obj):
+    """
+    Convert an object like `todict`, but only one level deep. Dicts and objects are wrapped in a LazyDict that
+    converts each of its values when it is first accessed, and lists are converted item by item.
+    """
+    if type(obj) in _TODICT_JSON_SCALARS or isinstance(obj, LazyDict):
+        return obj
+    kind = _get_todict_kind(obj)
+    if kind is _TODICT_DICT:
+        return LazyDict(obj)
+    if kind is _TODICT_LIST:
+        return [todict_lazy(item) for item in obj]
+    if kind is _TODICT_ASDICT:
+        return LazyDict(obj._asdict())
+    if kind is _TODICT_OBJECT:
+        return LazyDict((_to_camel_case_cached(k), v) for k, v in obj.__dict__.items()
+                        if not callable(v) and not k.startswith('_'))
+    return todict(obj)
+
+
+class LazyFile(object):
+    """ A file that is only opened when it is first used, so that it can be passed around without holding a handle.
+
+    Arguments registered with a `file_mode` of 'stream' or 'binary' receive their '@'-prefixed files as a LazyFile.
+    It can be read like a file object, or used as a context manager that closes the file on exit.
+    """
+
+    def __init__(self, path, mode='r', encoding=None):
+        self.path = path
+        self.mode = mode
+        self.encoding = encoding
+        self._file = None
+
+    def open(self):
+        """ Open the file if it is not open yet
+
+        :return: The file object
+        """
+        if self._file is None or self._file.closed:
+            self._file = open(self.path, self.mode, encoding=self.encoding)  # pylint: disable=consider-using-with
+        return self._file
+
+    def __getattr__(self, name):
+        # Nothing is delegated before the instance is set up, e.g. while it is copied or unpickled
+        if name.startswith('__') or '_file' not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.open(), name)
+
+    def __iter__(self):
+        return iter(self.open())
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __fspath__(self):
+        return self.path
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __repr__(self):
+        return '{}({!r}, mode={!r})'.format(self.__class__.__name__, self.path, self.mode)
+
+
+def run_awaitable(awaitable, loop=None):
+    """ Wait for a coroutine or other awaitable from synchronous code and return its result
+
+    :param awaitable: The awaitable
+    :param loop: The event loop to run the awaitable on, usually one running on another thread. A loop that isn't
+                 running is run until the awaitable is done. By default, the awaitable runs on a new event loop.
+    :type loop: asyncio.AbstractEventLoop
+    :return: The result of the awaitable
+    """
+    import asyncio
+
+    async def _await():
+        return await awaitable
+
+    if loop is None:
+        return asyncio.run(_await())
+    try:
+        running_loop = asyncio.get_running_loop()
+    except RuntimeError:
+        running_loop = None
+    if running_loop is loop:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise RuntimeError("Can't wait on the event loop of the current thread. "
+                           "Invoke the CLI on another thread, e.g. with loop.run_in_executor.")
+    if not loop.is_running():
+        # No thread would run the awaitable scheduled on the loop
+        return loop.run_until_complete(_await())
+    return asyncio.run_coroutine_threadsafe(_await(), loop).result()
 
 
 def is_modern_terminal():
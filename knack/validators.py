@@ -3,6 +3,8 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+from collections import OrderedDict, defaultdict, namedtuple
+
 
 class DefaultStr(str):
 
@@ -18,3 +20,342 @@ class DefaultInt(int):
         instance = int.__new__(cls, *args, **kwargs)
         instance.is_default = True
         return instance
+
+
+# The maximum number of validators that run concurrently on threads
+MAX_VALIDATOR_WORKERS = 8
+
+# The maximum number of changes in the validation cache of a CLI, for all the validators. Validators created during
+# each invocation, e.g. by a factory, are new objects each time, so their changes are only bound by this number.
+MAX_CACHED_VALIDATIONS = 1024
+
+
+def depends_on(*dests):
+    """ Declare the arguments that an argument validator reads. The validator then runs after the validators of those
+    arguments, and concurrently with the validators it doesn't depend on. Validators may be coroutine functions.
+
+    :param dests: The destinations of the arguments the validator depends on
+    :type dests: str
+    """
+    def decorate(validator):
+        validator.depends_on = frozenset(dests)
+        return validator
+    return decorate
+
+
+def get_validator_waves(validators, dests):
+    """ Group the argument validators into waves, where each validator runs after the validators of the arguments
+    it depends on. Validators that don't declare their dependencies with `depends_on` all run in order, one at a time,
+    as do all the validators when the destinations of their arguments aren't known.
+    Circular dependencies are run in the order of the validators.
+
+    :param validators: The argument validators
+    :type validators: list
+    :param dests: The destination of the argument of each validator, if known
+    :type dests: list
+    :return: The waves of validators that can run concurrently, in order
+    :rtype: list
+    """
+    if len(dests) != len(validators) or any(dest is None for dest in dests) or \
+            any(getattr(validator, 'depends_on', None) is None for validator in validators):
+        return [[validator] for validator in validators]
+
+    positions_by_dest = defaultdict(set)
+    for position, dest in enumerate(dests):
+        positions_by_dest[dest].add(position)
+    dependencies = [{dependency for dest in validator.depends_on for dependency in positions_by_dest[dest]
+                     if dependency != position}
+                    for position, validator in enumerate(validators)]
+
+    waves = []
+    remaining = list(range(len(validators)))
+    while remaining:
+        wave = [position for position in remaining if not dependencies[position].intersection(remaining)]
+        # Break a circular dependency with the first of the validators
+        wave = wave or remaining[:1]
+        remaining = [position for position in remaining if position not in wave]
+        waves.append([validators[position] for position in wave])
+    return waves
+
+
+def cache_validation(ttl=None, maxsize=128, keys=None, config=None):
+    """ Cache the changes a validator makes to the namespace in the validation cache of the CLI. When the validator
+    runs again with the same argument values and config, the changes are applied without running it.
+    Only the attributes the validator assigns are cached, not changes to the values themselves.
+
+    :param ttl: The number of seconds the changes are cached for, or None to cache them until they are evicted
+    :type ttl: float
+    :param maxsize: The maximum number of changes cached for the validator
+    :type maxsize: int
+    :param keys: The destinations of the arguments the changes depend on. Defaults to all the arguments.
+    :type keys: list
+    :param config: The (section, option) pairs of the config the changes depend on
+    :type config: list
+    """
+    def decorate(validator):
+        validator.cache_options = _ValidationCacheOptions(ttl, maxsize, tuple(keys) if keys is not None else None,
+                                                          tuple(config or ()))
+        return validator
+    return decorate
+
+
+_ValidationCacheOptions = namedtuple('_ValidationCacheOptions', ['ttl', 'maxsize', 'keys', 'config'])
+
+
+class ValidationCache(object):
+
+    def __init__(self, cli_ctx=None):
+        """ The changes that the validators decorated with `cache_validation` made to the namespace, by validator
+        and the values of the arguments and config they depend on. The cache lives as long as the CLI, so that it
+        is used by all invocations of a process, and holds at most MAX_CACHED_VALIDATIONS changes.
+
+        :param cli_ctx: CLI Context
+        :type cli_ctx: knack.cli.CLI
+        """
+        import threading
+        self.cli_ctx = cli_ctx
+        # The changes of each validator, the least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_key(self, validator, namespace):
+        """ Get the key of the changes of a validator, or None if the values it depends on can't be hashed
+
+        :param validator: The validator
+        :type validator: callable
+        :param namespace: The parsed arguments
+        :type namespace: argparse.Namespace
+        :rtype: tuple
+        """
+        options = validator.cache_options
+        values = vars(namespace)
+        dests = options.keys if options.keys is not None else _get_argument_dests(namespace)
+        try:
+            key = tuple((dest, _freeze(values.get(dest))) for dest in dests)
+            hash(key)
+        except TypeError:
+            return None
+        if options.config and self.cli_ctx:
+            key += tuple(self.cli_ctx.config.get(section, option, fallback=None)
+                         for section, option in options.config)
+        return key
+
+    def get(self, validator, key):
+        """ Get the cached changes of a validator, or None if there are none
+
+        :param validator: The validator
+        :type validator: callable
+        :param key: The key from `get_key`
+        :type key: tuple
+        :return: The attributes that were set and the attributes that were deleted
+        :rtype: tuple
+        """
+        import time
+        with self._lock:
+            entries = self._entries.get(validator)
+            entry = entries.get(key) if entries else None
+            if entry is None:
+                return None
+            expires, changes = entry
+            if expires is not None and expires <= time.monotonic():
+                self._remove(validator, key)
+                return None
+            self._entries.move_to_end(validator)
+            entries.move_to_end(key)
+            return changes
+
+    def set(self, validator, key, changes):
+        """ Cache the changes of a validator
+
+        :param validator: The validator
+        :type validator: callable
+        :param key: The key from `get_key`
+        :type key: tuple
+        :param changes: The attributes that were set and the attributes that were deleted
+        :type changes: tuple
+        """
+        import time
+        options = validator.cache_options
+        expires = time.monotonic() + options.ttl if options.ttl is not None else None
+        with self._lock:
+            entries = self._entries.setdefault(validator, OrderedDict())
+            self._entries.move_to_end(validator)
+            if key not in entries:
+                self._size += 1
+            entries[key] = (expires, changes)
+            entries.move_to_end(key)
+            while len(entries) > max(options.maxsize, 0):
+                self._remove(validator, next(iter(entries)))
+            while self._size > MAX_CACHED_VALIDATIONS:
+                # Evict the least recently used changes of the least recently used validator
+                oldest_validator, oldest_entries = next(iter(self._entries.items()))
+                self._remove(oldest_validator, next(iter(oldest_entries)))
+
+    def _remove(self, validator, key):
+        entries = self._entries[validator]
+        del entries[key]
+        self._size -= 1
+        if not entries:
+            del self._entries[validator]
+
+    def clear(self):
+        """ Remove all the cached changes """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+# The defaults the parser adds to the namespace of a command besides the values of its arguments
+_COMMAND_DEFAULTS = frozenset(['func', 'command'])
+
+
+def _get_argument_dests(namespace):
+    """ Get the destinations of the arguments of the command, in a stable order """
+    values = vars(namespace)
+    parser = values.get('_parser')
+    if parser is not None:
+        dests = {action.dest for action in parser._actions}  # pylint: disable=protected-access
+    else:
+        dests = set(values).difference(_COMMAND_DEFAULTS)
+    # The other attributes that start with '_' hold the state of the invocation, e.g. the global arguments
+    return sorted(dest for dest in dests if dest in values and not dest.startswith('_'))
+
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    return value
+
+
+def _apply_changes(namespace, changes):
+    set_attrs, deleted_attrs = changes
+    for attr, value in set_attrs:
+        setattr(namespace, attr, value)
+    for attr in deleted_attrs:
+        if hasattr(namespace, attr):
+            delattr(namespace, attr)
+
+
+def _call_validator(validator, namespace, cache=None, values=None):
+    """ Call a validator, or apply its cached changes. Returns an awaitable for coroutine validators.
+    `values` are the attributes of the namespace when the validators of a concurrent wave started. """
+    if cache is None or getattr(validator, 'cache_options', None) is None:
+        return validator(namespace)
+    import argparse
+    import copy
+    import inspect
+    original = dict(vars(namespace)) if values is None else values
+    # Validate a copy to find the changes, even while other validators change the namespace
+    validated = argparse.Namespace(**original)
+    key = cache.get_key(validator, validated)
+    if key is None:
+        return validator(namespace)
+    changes = cache.get(validator, key)
+    if changes is not None:
+        # Copy the values, so that changes to the values of one invocation don't reach the next ones
+        _apply_changes(namespace, copy.deepcopy(changes))
+        return None
+
+    def _cache_changes():
+        validated_values = vars(validated)
+        changes = (tuple((attr, value) for attr, value in validated_values.items()
+                         if attr not in original or original[attr] is not value),
+                   tuple(attr for attr in original if attr not in validated_values))
+        try:
+            cache.set(validator, key, copy.deepcopy(changes))
+        except (TypeError, copy.Error):
+            # The values can't be copied, e.g. clients that hold a lock
+            pass
+        _apply_changes(namespace, changes)
+
+    result = validator(validated)
+    if inspect.isawaitable(result):
+        async def _await():
+            await result
+            _cache_changes()
+        return _await()
+    _cache_changes()
+    return None
+
+
+def run_validator(validator, namespace, cache=None, loop=None):
+    """ Run a validator, waiting for the result if it is a coroutine
+
+    :param validator: The validator
+    :type validator: callable
+    :param namespace: The parsed arguments
+    :type namespace: argparse.Namespace
+    :param cache: The cache of the validators decorated with `cache_validation`
+    :type cache: knack.validators.ValidationCache
+    :param loop: The event loop to run coroutines on, see `knack.util.run_awaitable`
+    :type loop: asyncio.AbstractEventLoop
+    """
+    _run_validator(validator, namespace, cache, loop)
+
+
+def _run_validator(validator, namespace, cache, loop, values=None):
+    import inspect
+    result = _call_validator(validator, namespace, cache, values)
+    if inspect.isawaitable(result):
+        from .util import run_awaitable
+        run_awaitable(result, loop)
+
+
+def run_validators(validators, dests, namespace, cache=None, loop=None):
+    """ Run the argument validators by waves. The validators of a wave run concurrently, coroutines on an event loop
+    and other validators on threads. When validators of a wave fail, the later waves don't run. The error is raised
+    as it is if only one of them failed, and otherwise a CLIError with the messages of all the errors is raised from
+    the first one.
+
+    :param validators: The argument validators
+    :type validators: list
+    :param dests: The destination of the argument of each validator, if known
+    :type dests: list
+    :param namespace: The parsed arguments
+    :type namespace: argparse.Namespace
+    :param cache: The cache of the validators decorated with `cache_validation`
+    :type cache: knack.validators.ValidationCache
+    :param loop: The event loop to run coroutines on, see `knack.util.run_awaitable`
+    :type loop: asyncio.AbstractEventLoop
+    """
+    for wave in get_validator_waves(validators, dests):
+        if len(wave) == 1:
+            run_validator(wave[0], namespace, cache, loop)
+            continue
+        errors = [result for result in _run_concurrently(wave, namespace, cache, loop)
+                  if isinstance(result, BaseException)]
+        # e.g. KeyboardInterrupt
+        interrupts = [error for error in errors if not isinstance(error, Exception)]
+        if interrupts:
+            raise interrupts[0]
+        if len(errors) == 1:
+            raise errors[0]
+        if errors:
+            from .util import CLIError
+            raise CLIError('\n'.join(str(error) for error in errors)) from errors[0]
+
+
+def _run_concurrently(validators, namespace, cache, loop):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    values = dict(vars(namespace))
+
+    async def _run_coroutine(validator):
+        result = _call_validator(validator, namespace, cache, values)
+        if result is not None:
+            await result
+
+    async def _run():
+        running_loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=min(len(validators), MAX_VALIDATOR_WORKERS),
+                                thread_name_prefix='knack-validator') as executor:
+            return await asyncio.gather(*[_run_coroutine(validator) if asyncio.iscoroutinefunction(validator)
+                                          else running_loop.run_in_executor(executor, _run_validator, validator,
+                                                                            namespace, cache, loop, values)
+                                          for validator in validators], return_exceptions=True)
+    from .util import run_awaitable
+    return run_awaitable(_run(), loop)
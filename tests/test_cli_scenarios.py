@@ -150,6 +150,206 @@ class TestCLIScenarios(unittest.TestCase):
         stderr_isatty_mock.return_value = False
         self.assertEqual(cli._should_enable_color(), False)
 
+    def test_query_converts_result_lazily(self):
+        class Unconvertible:  # pylint: disable=too-few-public-methods
+            def __init__(self):
+                self.myself = self
+
+        class Resource:  # pylint: disable=too-few-public-methods
+            def __init__(self, name):
+                self.resource_name = name
+                self.details = Unconvertible()
+
+        def a_test_command_handler(_):
+            return [Resource('a'), Resource('b')]
+
+        class MyCommandsLoader(CLICommandsLoader):
+            def load_command_table(self, args):
+                self.command_table['abc list'] = CLICommand(self.cli_ctx, 'abc list', a_test_command_handler)
+                return OrderedDict(self.command_table)
+
+        mycli = CLI(cli_name='exapp1', config_dir=os.path.expanduser(os.path.join('~', '.exapp1')),
+                    commands_loader_cls=MyCommandsLoader)
+        mock_stdout = StringIO()
+        # 'details' can't be converted, but the query doesn't touch it
+        exit_code = mycli.invoke(['abc', 'list', '--query', '[].{name: resourceName}', '-o', 'tsv'],
+                                 out_file=mock_stdout)
+        self.assertEqual(0, exit_code)
+        self.assertEqual(mock_stdout.getvalue(), 'a\nb\n')
+
+        mock_stdout = StringIO()
+        exit_code = mycli.invoke(['abc', 'list', '--query', 'length([0])'], out_file=mock_stdout)
+        self.assertEqual(mock_stdout.getvalue(), '2\n')
+
+    def test_query_keeps_column_order(self):
+        def a_test_command_handler(_):
+            return [{'a': 1, 'b': 2}, {'a': 3, 'b': 4}]
+
+        class MyCommandsLoader(CLICommandsLoader):
+            def load_command_table(self, args):
+                self.command_table['abc list'] = CLICommand(self.cli_ctx, 'abc list', a_test_command_handler)
+                return OrderedDict(self.command_table)
+
+        mycli = CLI(cli_name='exapp1', config_dir=os.path.expanduser(os.path.join('~', '.exapp1')),
+                    commands_loader_cls=MyCommandsLoader)
+        for output_format, expected_output in [('tsv', '1\t2\n3\t4\n'), ('csv', 'z,b\n1,2\n3,4\n')]:
+            mock_stdout = StringIO()
+            exit_code = mycli.invoke(['abc', 'list', '--query', '[].{z: a, b: b}', '-o', output_format],
+                                     out_file=mock_stdout)
+            self.assertEqual(0, exit_code)
+            self.assertEqual(mock_stdout.getvalue(), expected_output)
+
+    def test_truncated_output_exit_code(self):
+        def a_test_command_handler(_):
+            return ['a', 'b']
+
+        class MyCommandsLoader(CLICommandsLoader):
+            def load_command_table(self, args):
+                self.command_table['abc list'] = CLICommand(self.cli_ctx, 'abc list', a_test_command_handler)
+                return OrderedDict(self.command_table)
+
+        mycli = CLI(cli_name='exapp1', config_dir=os.path.expanduser(os.path.join('~', '.exapp1')),
+                    commands_loader_cls=MyCommandsLoader)
+        for max_bytes, expected_output, expected_exit_code in [('8', '"a"\n"b"\n', 0), ('6', '"a"\n', 3)]:
+            mock_stdout = StringIO()
+            exit_code = mycli.invoke(['abc', 'list', '-o', 'jsonl', '--output-max-bytes', max_bytes,
+                                      '--only-show-errors'], out_file=mock_stdout)
+            self.assertEqual(mock_stdout.getvalue(), expected_output)
+            self.assertEqual(exit_code, expected_exit_code)
+
+    def test_unregister_event_during_raise(self):
+        calls = []
+
+        def first_handler(cli_ctx, **_):
+            calls.append('first')
+            cli_ctx.unregister_event('Test.Event', first_handler)
+
+        def second_handler(_, **__):
+            calls.append('second')
+
+        self.mock_ctx.register_event('Test.Event', first_handler)
+        self.mock_ctx.register_event('Test.Event', second_handler)
+        self.mock_ctx.raise_event('Test.Event')
+        self.mock_ctx.raise_event('Test.Event')
+        self.assertEqual(calls, ['first', 'second', 'second'])
+
+    def test_raise_event_without_handlers(self):
+        self.mock_ctx.raise_event('Test.NoHandlers')
+        self.assertNotIn('Test.NoHandlers', self.mock_ctx._event_handlers)  # pylint: disable=protected-access
+
+    def test_event_handler_priority(self):
+        calls = []
+        self.mock_ctx.register_event('Test.Event', lambda _, **__: calls.append('default'))
+        self.mock_ctx.register_event('Test.Event', lambda _, **__: calls.append('low'), priority=-1)
+        self.mock_ctx.register_event('Test.Event', lambda _, **__: calls.append('high'), priority=10)
+        self.mock_ctx.register_event('Test.Event', lambda _, **__: calls.append('default2'))
+        self.mock_ctx.raise_event('Test.Event')
+        self.assertEqual(calls, ['high', 'default', 'default2', 'low'])
+
+    def test_event_handler_once(self):
+        calls = []
+        self.mock_ctx.register_event('Test.Event', lambda _, **__: calls.append('once'), once=True)
+        self.mock_ctx.raise_event('Test.Event')
+        self.mock_ctx.raise_event('Test.Event')
+        self.assertEqual(calls, ['once'])
+        self.assertEqual(self.mock_ctx._event_handlers['Test.Event'], [])  # pylint: disable=protected-access
+
+    def test_event_handler_registered_twice(self):
+        calls = []
+
+        def handler(_, **__):
+            calls.append('called')
+
+        # Each registration keeps its own options
+        self.mock_ctx.register_event('Test.Event', handler)
+        self.mock_ctx.register_event('Test.Event', handler, once=True)
+        self.mock_ctx.raise_event('Test.Event')
+        self.mock_ctx.raise_event('Test.Event')
+        self.assertEqual(calls, ['called'] * 3)
+        self.mock_ctx.unregister_event('Test.Event', handler)
+        self.mock_ctx.raise_event('Test.Event')
+        self.assertEqual(calls, ['called'] * 3)
+
+    def test_event_handler_asynchronous(self):
+        import threading
+        called = threading.Event()
+
+        def handler(_, **kwargs):
+            self.assertEqual(kwargs['value'], 1)
+            called.set()
+
+        self.mock_ctx.register_event('Test.Event', handler, asynchronous=True)
+        self.mock_ctx.raise_event('Test.Event', value=1)
+        self.assertTrue(called.wait(5))
+
+    def test_event_executor_shutdown(self):
+        import threading
+        called = threading.Event()
+        cli = CLI(out_file=StringIO())
+        cli.register_event('Cli.PreExecute', lambda _, **__: called.set(), asynchronous=True)
+        cli.invoke(['--version'])
+        self.assertTrue(called.wait(5))
+        # The executor of the asynchronous handlers is shut down when the invocation finishes
+        self.assertIsNone(cli._event_executor)  # pylint: disable=protected-access
+
+    def test_event_handler_invocation_scoped(self):
+        calls = []
+
+        def a_test_command_handler(_):
+            return [{'a': 1}, {'a': 2}]
+
+        class MyCommandsLoader(CLICommandsLoader):
+            def load_command_table(self, args):
+                self.command_table['abc list'] = CLICommand(self.cli_ctx, 'abc list', a_test_command_handler)
+                return OrderedDict(self.command_table)
+
+        def register_scoped_handler(cli_ctx, **_):
+            cli_ctx.register_event('Test.Event', lambda _, **__: calls.append('scoped'), invocation_scoped=True)
+
+        mycli = CLI(cli_name='exapp1', config_dir=os.path.expanduser(os.path.join('~', '.exapp1')),
+                    commands_loader_cls=MyCommandsLoader)
+        mycli.register_event('Cli.PreExecute', register_scoped_handler, once=True)
+        mycli.invoke(['abc', 'list'], out_file=StringIO())
+        mycli.raise_event('Test.Event')
+        self.assertEqual(calls, [])
+
+        # A query that is never applied because the invocation fails must not leak into the next invocation
+        mock_stdout = StringIO()
+        with mock.patch.object(CommandInvoker, '_validation', side_effect=KeyboardInterrupt):
+            mycli.invoke(['abc', 'list', '--query', '[0]'], out_file=mock_stdout)
+        mycli.invoke(['abc', 'list', '-o', 'tsv'], out_file=mock_stdout)
+        self.assertEqual(mock_stdout.getvalue(), '1\n2\n')
+
+    def test_event_timings(self):
+        def handler(_, **__):
+            pass
+
+        self.mock_ctx.register_event('Test.Event', handler)
+        self.mock_ctx.raise_event('Test.Event')
+        self.assertEqual(self.mock_ctx.get_event_timings(), [])
+
+        self.mock_ctx.collect_event_timings = True
+        self.mock_ctx.raise_event('Test.Event')
+        self.mock_ctx.raise_event('Test.Event')
+        timings = self.mock_ctx.get_event_timings()
+        self.assertEqual(len(timings), 1)
+        self.assertEqual(timings[0]['event'], 'Test.Event')
+        self.assertTrue(timings[0]['handler'].endswith('test_event_timings.<locals>.handler'))
+        self.assertEqual(timings[0]['count'], 2)
+        self.assertGreaterEqual(timings[0]['total_ms'], timings[0]['max_ms'])
+
+        self.mock_ctx.reset_event_timings()
+        self.assertEqual(self.mock_ctx.get_event_timings(), [])
+
+    @redirect_io
+    def test_event_timings_debug_summary(self):
+        cli = CLI()
+        cli.register_event('Cli.PreExecute', lambda _, **__: None)
+        cli.invoke(['--debug'])
+        actual = self.io.getvalue()
+        self.assertIn('Event handler timings:', actual)
+        self.assertIn('Cli.PreExecute', actual)
+
     @redirect_io
     def test_init_log(self):
         class MyCLI(CLI):
@@ -163,6 +363,40 @@ class TestCLIScenarios(unittest.TestCase):
         self.assertIn("6aa19a11", actual)
         self.assertIn("b0746f58", actual)
 
+    def test_async_handler(self):
+        import asyncio
+
+        async def handler(args):
+            results = await asyncio.gather(*[asyncio.sleep(0, result=name) for name in args['names']])
+            return {'names': results}
+
+        command = CLICommand(self.mock_ctx, 'test command', handler)
+        command.add_argument('names', '--names', nargs='+')
+        self.mock_ctx.invocation = CommandInvoker(cli_ctx=self.mock_ctx)
+        self.mock_ctx.invocation.commands_loader.command_table = {'test command': command}
+        result = self.mock_ctx.invocation.execute('test command --names a b'.split())
+        self.assertEqual(result.result, {'names': ['a', 'b']})
+
+    def test_async_handler_event_loop(self):
+        import asyncio
+        import threading
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(loop.call_soon_threadsafe, loop.stop)
+
+        async def handler(_):
+            return threading.current_thread() is thread
+
+        command = CLICommand(self.mock_ctx, 'test command', handler)
+        self.mock_ctx.event_loop = loop
+        self.mock_ctx.invocation = CommandInvoker(cli_ctx=self.mock_ctx)
+        self.mock_ctx.invocation.commands_loader.command_table = {'test command': command}
+        result = self.mock_ctx.invocation.execute('test command'.split())
+        # The handler ran on the loop of the host
+        self.assertTrue(result.result)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -54,6 +54,18 @@ class TestCommandRegistration(unittest.TestCase):
                                 raw=False, **operation_config):
         pass
 
+    @staticmethod
+    async def sample_async_command_handler(client, group_name, resource_name=None):
+        """
+        The operation to get a virtual machine asynchronously.
+
+        :param group_name: The name of the group.
+        :type group_name: str
+        :param resource_name: The name of the resource.
+        :type resource_name: str
+        """
+        return [client, group_name, resource_name]
+
     def _set_command_name(self, command):
         self.mock_ctx.invocation.data['command_string'] = command
         return command
@@ -84,6 +96,55 @@ class TestCommandRegistration(unittest.TestCase):
             self.assertTrue(contains_subset)
         self.assertEqual(command_metadata.arguments['resource_name'].options_list, ('--wonky-name', '-n'))
 
+    def test_register_async_command(self):
+        from knack.util import run_awaitable
+
+        async def _client_factory(command_args):
+            return 'client-' + command_args['group_name']
+
+        cl = CLICommandsLoader(self.mock_ctx, excluded_command_handler_args=['client'])
+        command_name = self._set_command_name('test register sample-command')
+        with CommandGroup(cl, 'test register', '{}#{{}}'.format(__name__), client_factory=_client_factory) as g:
+            g.command('sample-command', '{}.{}'.format(TestCommandRegistration.__name__,
+                                                       TestCommandRegistration.sample_async_command_handler.__name__))
+        cl.load_arguments(command_name)
+        command_metadata = cl.command_table[command_name]
+        self.assertEqual(sorted(command_metadata.arguments), ['group_name', 'resource_name'])
+        result = command_metadata({'group_name': 'g', 'resource_name': 'r'})
+        self.assertEqual(run_awaitable(result), ['client-g', 'g', 'r'])
+
+    def test_register_arguments_loader(self):
+        cl = CLICommandsLoader(self.mock_ctx)
+        command_name = self._set_command_name('test register sample-command')
+        with CommandGroup(cl, 'test register', '{}#{{}}'.format(__name__)) as g:
+            g.command('sample-command', '{}.{}'.format(TestCommandRegistration.__name__,
+                                                       TestCommandRegistration.sample_command_handler.__name__))
+        loaded_scopes = []
+
+        def _loader(help_text):
+            def _load(c):
+                loaded_scopes.append(c.command_scope)
+                c.argument('resource_name', help=help_text)
+            return _load
+
+        cl.register_arguments_loader('test  register', _loader('group help'))
+        cl.register_arguments_loader(command_name, _loader('command help'))
+        cl.register_arguments_loader('', _loader('global help'))
+        cl.register_arguments_loader('test reg', _loader('other help'))
+        cl.register_arguments_loader('other', _loader('other help'))
+        cl.load_arguments(command_name)
+        # Only the ancestor scopes of the command are loaded, from the least to the most specific
+        self.assertEqual(loaded_scopes, ['', 'test register', command_name])
+        self.assertEqual(cl.command_table[command_name].arguments['resource_name'].type.settings['help'],
+                         'command help')
+        # The loaders of a scope only run once
+        cl.load_arguments(command_name)
+        self.assertEqual(len(loaded_scopes), 3)
+
+        cl.skip_applicability = True
+        cl.load_arguments(command_name)
+        self.assertEqual(loaded_scopes[3:], ['test reg', 'other'])
+
     def test_register_command_custom_excluded_params(self):
         command_name = self._set_command_name('test sample-command')
         ep = ['self', 'raw', 'custom_headers', 'operation_config', 'content_version', 'kwargs', 'client']
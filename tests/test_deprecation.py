@@ -358,6 +358,19 @@ Arguments
         expected = "Argument 'arg1' has been deprecated and will be removed in a future release."
         self.assertIn(expected, actual)
 
+    @redirect_io
+    def test_deprecate_arguments_share_action_class(self):
+        """ Ensure deprecated arguments use the same action class and still report their own deprecation. """
+        self.cli_ctx.invoke('arg-test --arg1 foo --opt1 bar --arg3 bar --alt4 baz'.split())
+        arguments = self.cli_ctx.invocation.commands_loader.argument_registry.arguments['arg-test']
+        self.assertIs(arguments['arg1'].settings['action'], arguments['arg3'].settings['action'])
+        self.assertIs(arguments['opt1'].settings['action'], arguments['opt4'].settings['action'])
+        actual = self.io.getvalue()
+        self.assertIn("Argument 'arg1' has been deprecated and will be removed in a future release.", actual)
+        self.assertIn("Argument 'arg3' has been deprecated and will be removed in a future release.", actual)
+        self.assertIn("Option '--alt4' has been deprecated and will be removed in version '1.0.0'. "
+                      "Use '--opt4' instead.", actual)
+
     @redirect_io
     def test_deprecate_arguments_execute_hidden(self):
         """ Ensure hidden deprecated arguments can be used. """
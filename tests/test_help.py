@@ -277,8 +277,12 @@ Global Arguments
     --debug              : Increase logging verbosity to show all debug logs.
     --help -h            : Show this help message and exit.
     --only-show-errors   : Only show errors, suppressing warnings.
-    --output -o          : Output format.  Allowed values: json, jsonc, none, table, tsv, yaml,
-                           yamlc.  Default: json.
+    --output -o          : Output format.  Allowed values: cbor, csv, json, json-compact, jsonc,
+                           jsonl, msgpack, none, table, tsv, yaml, yamlc.  Default: json.
+    --output-max-bytes   : Truncate the output to this number of bytes. Defaults to section=core,
+                           option=output_max_bytes in config.
+    --output-max-items   : Truncate list results to this number of items. Defaults to section=core,
+                           option=output_max_items in config.
     --query              : JMESPath query string. See http://jmespath.org/ for more information and
                            examples.
     --verbose            : Increase logging verbosity. Use --debug for full debug logs.
@@ -312,8 +316,12 @@ Global Arguments
     --debug            : Increase logging verbosity to show all debug logs.
     --help -h          : Show this help message and exit.
     --only-show-errors : Only show errors, suppressing warnings.
-    --output -o        : Output format.  Allowed values: json, jsonc, none, table, tsv, yaml, yamlc.
-                         Default: json.
+    --output -o        : Output format.  Allowed values: cbor, csv, json, json-compact, jsonc,
+                         jsonl, msgpack, none, table, tsv, yaml, yamlc.  Default: json.
+    --output-max-bytes : Truncate the output to this number of bytes. Defaults to section=core,
+                         option=output_max_bytes in config.
+    --output-max-items : Truncate list results to this number of items. Defaults to section=core,
+                         option=output_max_items in config.
     --query            : JMESPath query string. See http://jmespath.org/ for more information and
                          examples.
     --verbose          : Increase logging verbosity. Use --debug for full debug logs.
@@ -429,8 +437,12 @@ Global Arguments
     --exampl           : This is a new global argument.
     --help -h          : Show this help message and exit.
     --only-show-errors : Only show errors, suppressing warnings.
-    --output -o        : Output format.  Allowed values: json, jsonc, none, table, tsv, yaml, yamlc.
-                         Default: json.
+    --output -o        : Output format.  Allowed values: cbor, csv, json, json-compact, jsonc,
+                         jsonl, msgpack, none, table, tsv, yaml, yamlc.  Default: json.
+    --output-max-bytes : Truncate the output to this number of bytes. Defaults to section=core,
+                         option=output_max_bytes in config.
+    --output-max-items : Truncate list results to this number of items. Defaults to section=core,
+                         option=output_max_items in config.
     --query            : JMESPath query string. See http://jmespath.org/ for more information and
                          examples.
     --verbose          : Increase logging verbosity. Use --debug for full debug logs.
@@ -3,12 +3,13 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import json
 import unittest
 from unittest import mock
 import logging
 
 from knack.events import EVENT_PARSER_GLOBAL_CREATE, EVENT_INVOKER_PRE_CMD_TBL_CREATE
-from knack.log import CLILogging, get_logger, CLI_LOGGER_NAME, _CustomStreamHandler
+from knack.log import CLILogging, get_logger, CLI_LOGGER_NAME, _CustomStreamHandler, _JsonLinesFormatter
 from knack.util import CLIError
 from tests.util import MockContext
 
@@ -159,6 +160,43 @@ class TestCLILogging(unittest.TestCase):
         expected = {'cli': '%(levelname)s: %(message)s', 'root': '%(levelname)s: %(message)s'}
         self.assertEqual(formats, expected)
 
+    def test_configure_cli_logger_level(self):
+        root_logger = logging.getLogger()
+        cli_logger = logging.getLogger(CLI_LOGGER_NAME)
+        original_handlers = root_logger.handlers[:]
+        try:
+            for argv, expected_level in [([], logging.WARNING), (['--debug'], logging.DEBUG)]:
+                root_logger.handlers.clear()
+                cli_logger.handlers.clear()
+                self.cli_logging.configure(argv)
+                self.assertEqual(cli_logger.level, expected_level)
+                self.assertEqual(get_logger('a.module').isEnabledFor(logging.DEBUG),
+                                 expected_level == logging.DEBUG)
+        finally:
+            root_logger.handlers[:] = original_handlers
+            cli_logger.handlers.clear()
+            cli_logger.setLevel(logging.DEBUG)
+
+    def test_configure_cli_logger_level_other_handlers(self):
+        root_logger = logging.getLogger()
+        cli_logger = logging.getLogger(CLI_LOGGER_NAME)
+        original_handlers = root_logger.handlers[:]
+        records = []
+        other_handler = logging.Handler(logging.DEBUG)
+        other_handler.emit = records.append
+        try:
+            root_logger.handlers.clear()
+            cli_logger.handlers[:] = [other_handler]
+            self.cli_logging.configure([])
+            # The level isn't raised, so the handler attached before still receives debug records
+            self.assertEqual(cli_logger.level, logging.DEBUG)
+            get_logger('a.module').debug('debug message')
+            self.assertEqual([record.getMessage() for record in records], ['debug message'])
+        finally:
+            root_logger.handlers[:] = original_handlers
+            cli_logger.handlers.clear()
+            cli_logger.setLevel(logging.DEBUG)
+
 
 class TestCustomStreamHandler(unittest.TestCase):
     expectation = {
@@ -176,5 +214,46 @@ class TestCustomStreamHandler(unittest.TestCase):
             self.assertTrue(message.endswith('\x1b[0m'))
 
 
+class TestJsonLinesFormatter(unittest.TestCase):
+    def setUp(self):
+        self.mock_ctx = MockContext()
+        self.mock_ctx.data['invocation_id'] = 'a1b2c3'
+        self.mock_ctx.invocation.data['command'] = 'abc xyz'
+
+    def test_log_format_default_text(self):
+        self.assertFalse(CLILogging('clitest', cli_ctx=self.mock_ctx).structured)
+
+    @mock.patch.dict('os.environ', {'CLI_LOGGING_LOG_FORMAT': 'JSON'})
+    def test_log_format_json(self):
+        self.assertTrue(CLILogging('clitest', cli_ctx=self.mock_ctx).structured)
+
+    @mock.patch.dict('os.environ', {'CLI_LOGGING_LOG_FORMAT': 'xml'})
+    def test_log_format_unknown_falls_back_to_text(self):
+        self.assertFalse(CLILogging('clitest', cli_ctx=self.mock_ctx).structured)
+
+    def test_format_record(self):
+        record = logging.LogRecord('cli.knack.cli', logging.DEBUG, __file__, 1, 'Handler %s took %.3f ms',
+                                   ('h', 1.5), None)
+        record.phase = 'Cli.PreExecute'
+        record.elapsed_ms = 1.5
+        entry = json.loads(_JsonLinesFormatter(self.mock_ctx).format(record))
+        self.assertEqual(entry['level'], 'DEBUG')
+        self.assertEqual(entry['logger'], 'cli.knack.cli')
+        self.assertEqual(entry['message'], 'Handler h took 1.500 ms')
+        self.assertEqual(entry['invocationId'], 'a1b2c3')
+        self.assertEqual(entry['command'], 'abc xyz')
+        self.assertEqual(entry['phase'], 'Cli.PreExecute')
+        self.assertEqual(entry['elapsedMs'], 1.5)
+
+    def test_format_record_without_phase(self):
+        record = logging.LogRecord('cli', logging.WARNING, __file__, 1, 'multi\nline', None, None)
+        output = _JsonLinesFormatter(self.mock_ctx).format(record)
+        self.assertNotIn('\n', output)
+        entry = json.loads(output)
+        self.assertEqual(entry['message'], 'multi\nline')
+        self.assertIsNone(entry['phase'])
+        self.assertIsNone(entry['elapsedMs'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -6,17 +6,48 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import os
+import re
+import sys
+import tempfile
 import unittest
 from unittest import mock
 from collections import OrderedDict
-from io import StringIO
+from enum import Enum, IntEnum
+from importlib.util import find_spec
+from io import BytesIO, StringIO
 
 from knack.output import OutputProducer, format_json, format_json_color, format_yaml, format_yaml_color, \
-    format_table, format_tsv
-from knack.util import CommandResultItem, normalize_newlines
+    format_yaml_chunks, format_table, format_tsv, format_tsv_chunks, format_json_compact, \
+    format_jsonl, format_csv, format_msgpack, format_cbor, _iter_frames, _streaming_formatter, \
+    _item_streaming_formatter
+from knack.util import CLIError, CommandResultItem, normalize_newlines
 from tests.util import MockContext
 
 
+class _TtyStringIO(StringIO):
+
+    def isatty(self):
+        return True
+
+
+def _remove_color(text):
+    return re.sub(r'\x1b\[[0-9;]*m', '', text)
+
+
+def _module_installed(name):
+    return find_spec(name) is not None
+
+
+def _read_frames(data, decode):
+    values = []
+    while data:
+        length = int.from_bytes(data[:4], 'big')
+        values.append(decode(data[4:4 + length]))
+        data = data[4 + length:]
+    return values
+
+
 class TestOutput(unittest.TestCase):
 
     def setUp(self):
@@ -93,6 +124,388 @@ class TestOutput(unittest.TestCase):
 }
 """))
 
+    def test_out_json_compact(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem({'id': '0b1f6472', 'active': True, 'contents': b'0b1f', 'name': '生活'}),
+                            formatter=format_json_compact, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '{"active":true,"contents":"0b1f","id":"0b1f6472","name":"生活"}\n')
+
+    def test_out_json_compact_list(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            chunks = list(format_json_compact(CommandResultItem([{'b': 1, 'a': 2}, 1, 'x', None, []])))
+            output_producer.out(CommandResultItem([{'b': 1, 'a': 2}, 1, 'x', None, []]),
+                                formatter=format_json_compact, out_file=self.io)
+        self.assertEqual(chunks, ['[{"a":2,"b":1},1', ',"x",null', ',[]', ']\n'])
+        self.assertEqual(self.io.getvalue(), '[{"a":2,"b":1},1,"x",null,[]]\n')
+
+    def test_out_json_compact_empty_list(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem([]), formatter=format_json_compact, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '[]\n')
+
+    def test_out_jsonl(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            chunks = list(format_jsonl(CommandResultItem([{'b': 1, 'a': 2}, 'x', None])))
+            output_producer.out(CommandResultItem([{'b': 1, 'a': 2}, 'x', None]),
+                                formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(chunks, ['{"a":2,"b":1}\n"x"\n', 'null\n'])
+        self.assertEqual(self.io.getvalue(), '{"a":2,"b":1}\n"x"\nnull\n')
+
+    def test_out_jsonl_not_list(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem({'active': True, 'id': '0b1f6472'}),
+                            formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '{"active":true,"id":"0b1f6472"}\n')
+
+    def test_out_jsonl_empty_list(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem([]), formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '')
+
+    def test_out_streamed_output_flushed(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = mock.MagicMock()
+        formatter = _streaming_formatter(lambda _: iter(['a\n', 'b\n']))
+        output_producer.out(CommandResultItem(['a', 'b']), formatter=formatter, out_file=out_file)
+        self.assertEqual(out_file.flush.call_count, 2)
+
+    def test_out_registered_streaming(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.register_format('lines', lambda obj: obj.result, streaming=True)
+        output_producer.register_format('list', lambda obj: str(obj.result))
+        for format_type in ['lines', 'list']:
+            output_producer.out(CommandResultItem(['a\n', 'b\n']), formatter=output_producer.get_formatter(format_type),
+                                out_file=self.io)
+        self.assertEqual(self.io.getvalue(), "a\nb\n['a\\n', 'b\\n']")
+
+    def test_out_registered_streaming_attribute(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+
+        @_streaming_formatter
+        def _formatter(obj):
+            yield from obj.result
+
+        # Whether the format streams is read from the formatter unless it is given
+        output_producer.register_format('lines', _formatter)
+        self.assertTrue(output_producer.supports_streaming('lines'))
+        output_producer.out(CommandResultItem(['a\n', 'b\n']), formatter=output_producer.get_formatter('lines'),
+                            out_file=self.io)
+        self.assertEqual(self.io.getvalue(), 'a\nb\n')
+        output_producer.register_format('lines', _formatter, streaming=False)
+        self.assertFalse(output_producer.supports_streaming('lines'))
+
+    # Binary output tests
+
+    def test_out_frames(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = mock.MagicMock(spec=['buffer', 'flush'])
+        out_file.buffer = BytesIO()
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            chunks = list(_iter_frames(['ab', 'c', ''], str.encode))
+            output_producer.out(CommandResultItem(['ab', 'c', '']),
+                                formatter=_streaming_formatter(lambda obj: _iter_frames(obj.result, str.encode)),
+                                out_file=out_file)
+        self.assertEqual(chunks, [b'\x00\x00\x00\x02ab\x00\x00\x00\x01c', b'\x00\x00\x00\x00'])
+        self.assertEqual(out_file.buffer.getvalue(), b''.join(chunks))
+        self.assertEqual(list(_iter_frames('abc', str.encode)), [b'\x00\x00\x00\x03abc'])
+        self.assertEqual(list(_iter_frames([], str.encode)), [])
+
+    def test_out_frames_text_stream(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        formatter = _streaming_formatter(lambda obj: _iter_frames(obj.result, str.encode))
+        with self.assertRaisesRegex(CLIError, 'Unable to write binary output to a text stream'):
+            output_producer.out(CommandResultItem(['a']), formatter=formatter, out_file=self.io)
+
+    def test_out_binary_package_missing(self):
+        with mock.patch.dict('sys.modules', {'msgpack': None, 'cbor2': None}):
+            with self.assertRaisesRegex(CLIError, "requires the 'msgpack' package"):
+                format_msgpack(CommandResultItem([1]))
+            with self.assertRaisesRegex(CLIError, "requires the 'cbor2' package"):
+                format_cbor(CommandResultItem([1]))
+
+    @unittest.skipUnless(_module_installed('msgpack'), 'msgpack is not installed')
+    def test_out_msgpack(self):
+        import msgpack
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = BytesIO()
+        obj = [{'name': '生活', 'contents': b'0b1f', 'active': True}, None]
+        output_producer.out(CommandResultItem(obj), formatter=format_msgpack, out_file=out_file)
+        self.assertEqual(_read_frames(out_file.getvalue(), msgpack.unpackb), obj)
+
+    @unittest.skipUnless(_module_installed('cbor2'), 'cbor2 is not installed')
+    def test_out_cbor(self):
+        import cbor2
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = BytesIO()
+        obj = [{'name': '生活', 'contents': b'0b1f', 'active': True}, None]
+        output_producer.out(CommandResultItem(obj), formatter=format_cbor, out_file=out_file)
+        self.assertEqual(_read_frames(out_file.getvalue(), cbor2.loads), obj)
+
+    # Pager tests
+
+    def _set_pager(self, script):
+        self.mock_ctx.config.set_value('core', 'pager', '"{}" -c "{}"'.format(sys.executable, script))
+
+    def test_out_pager_not_configured(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = _TtyStringIO()
+        with mock.patch('subprocess.Popen') as popen_mock:
+            output_producer.out(CommandResultItem(list(range(100))), formatter=format_jsonl, out_file=out_file)
+        popen_mock.assert_not_called()
+        self.assertEqual(out_file.getvalue().count('\n'), 100)
+
+    def test_out_pager_not_tty(self):
+        self._set_pager('import sys; sys.stdin.read()')
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('subprocess.Popen') as popen_mock:
+            output_producer.out(CommandResultItem(list(range(100))), formatter=format_jsonl, out_file=self.io)
+        popen_mock.assert_not_called()
+        self.assertEqual(self.io.getvalue().count('\n'), 100)
+
+    def test_out_pager_fits_terminal(self):
+        self._set_pager('import sys; sys.stdin.read()')
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = _TtyStringIO()
+        with mock.patch('subprocess.Popen') as popen_mock, \
+                mock.patch('shutil.get_terminal_size', return_value=os.terminal_size((80, 10))):
+            output_producer.out(CommandResultItem(list(range(9))), formatter=format_json_compact, out_file=out_file)
+        popen_mock.assert_not_called()
+        self.assertEqual(out_file.getvalue(), '[0,1,2,3,4,5,6,7,8]\n')
+
+    def test_out_pager(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paged_file = os.path.join(temp_dir, 'paged.txt')
+            self._set_pager("import sys; open(r'{}', 'w').write(sys.stdin.read())".format(paged_file))
+            output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+            out_file = _TtyStringIO()
+            with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2), \
+                    mock.patch('shutil.get_terminal_size', return_value=os.terminal_size((80, 10))):
+                output_producer.out(CommandResultItem(list(range(100))), formatter=format_jsonl, out_file=out_file)
+            with open(paged_file) as f:
+                self.assertEqual(f.read(), ''.join('{}\n'.format(i) for i in range(100)))
+        self.assertEqual(out_file.getvalue(), '')
+
+    def test_out_pager_failed(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        for pager in ['no-such-pager-cmd', '"{}" -c "import sys; sys.exit(2)"'.format(sys.executable)]:
+            self.mock_ctx.config.set_value('core', 'pager', pager)
+            out_file = _TtyStringIO()
+            with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2), \
+                    mock.patch('shutil.get_terminal_size', return_value=os.terminal_size((80, 10))), \
+                    mock.patch('knack.output.logger') as logger_mock:
+                output_producer.out(CommandResultItem(list(range(100))), formatter=format_jsonl, out_file=out_file)
+            # The output is written to the output file instead
+            self.assertEqual(out_file.getvalue(), ''.join('{}\n'.format(i) for i in range(100)))
+            self.assertEqual(logger_mock.warning.call_args[0][:2], ("The pager '%s' failed with exit code %d", pager))
+
+    def test_out_pager_quit_stops_formatting(self):
+        self._set_pager('import sys; sys.stdin.readline()')
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        formatted = []
+
+        @_streaming_formatter
+        def _formatter(_):
+            for i in range(100000):
+                formatted.append(i)
+                yield 'x' * 1000 + '\n'
+
+        with mock.patch('shutil.get_terminal_size', return_value=os.terminal_size((80, 10))):
+            output_producer.out(CommandResultItem(None), formatter=_formatter, out_file=_TtyStringIO())
+        self.assertLess(len(formatted), 100000)
+
+    # Colored output tests
+
+    def test_out_json_color(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem({'b': [1, 'x', None, True], 'a': {}, 'c': b'0b1f'}),
+                            formatter=format_json_color, out_file=self.io)
+        self.assertEqual(self.io.getvalue(),
+                         '{\n'
+                         '  \x1b[94m"a"\x1b[39;49;00m: {},\n'
+                         '  \x1b[94m"b"\x1b[39;49;00m: [\n'
+                         '    \x1b[34m1\x1b[39;49;00m,\n'
+                         '    \x1b[33m"x"\x1b[39;49;00m,\n'
+                         '    \x1b[34mnull\x1b[39;49;00m,\n'
+                         '    \x1b[34mtrue\x1b[39;49;00m\n'
+                         '  ],\n'
+                         '  \x1b[94m"c"\x1b[39;49;00m: \x1b[33m"0b1f"\x1b[39;49;00m\n'
+                         '}\n')
+
+    def test_out_json_color_same_as_json(self):
+        obj = [{'name': '生活 "quoted"', 'id': 12, 'ratio': 1.5e-07, 'tags': {'a': [], 'b': [[1, -2], {'c': False}]}},
+               None, 'x', OrderedDict([('z', 1), ('y', 2)])]
+        self.assertEqual(_remove_color(format_json_color(CommandResultItem(obj))), format_json(CommandResultItem(obj)))
+
+    def test_out_json_color_fallback(self):
+        # Keys that are not strings are left to pygments
+        result = format_json_color(CommandResultItem({1: 'a'}))
+        self.assertEqual(_remove_color(result), format_json(CommandResultItem({1: 'a'})))
+        self.assertIn('\x1b[37m', result)
+
+    def test_out_yaml_color(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem({'b': [1, 'x: y'], 'a': '123', 'c': {'d': None}}),
+                            formatter=format_yaml_color, out_file=self.io)
+        self.assertEqual(self.io.getvalue(),
+                         '\x1b[94ma\x1b[39;49;00m:\x1b[33m \'123\'\x1b[39;49;00m\n'
+                         '\x1b[94mb\x1b[39;49;00m:\n'
+                         '- 1\n'
+                         '-\x1b[33m \'x: y\'\x1b[39;49;00m\n'
+                         '\x1b[94mc\x1b[39;49;00m:\n'
+                         '  \x1b[94md\x1b[39;49;00m: null\n')
+
+    def test_out_yaml_color_same_as_yaml(self):
+        obj = [{'name': '生活', 'multi': 'a\nb', 'long': 'word ' * 30, 'empty': '', 'nested': [{'a': True}]}, None]
+        self.assertEqual(_remove_color(format_yaml_color(CommandResultItem(obj))), format_yaml(CommandResultItem(obj)))
+
+    # Output limit tests
+
+    def test_out_max_items(self):
+        self.mock_ctx.config.set_value('core', 'output_max_items', '3')
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem(list(range(5))), formatter=format_jsonl, out_file=self.io)
+            output_producer.out(CommandResultItem({'a': 1}), formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '0\n1\n2\n{"a":1}\n')
+        logger_mock.warning.assert_called_once_with('The output was truncated to the first %d of %d items.', 3, 5)
+
+    def test_out_max_items_argument(self):
+        self.mock_ctx.config.set_value('core', 'output_max_items', '3')
+        self.mock_ctx.invocation.data['output_max_items'] = 1
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem(list(range(5))), formatter=format_json, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '[\n  0\n]\n')
+
+    def test_out_max_bytes(self):
+        self.mock_ctx.invocation.data['output_max_bytes'] = 8
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        formatted = []
+
+        @_streaming_formatter
+        def _formatter(_):
+            for i in range(100):
+                formatted.append(i)
+                yield '生{}\n'.format(i)
+
+        with mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem(None), formatter=_formatter, out_file=self.io)
+        # '生' is 3 bytes in UTF-8. The output is cut at the last complete line.
+        self.assertEqual(self.io.getvalue(), '生0\n')
+        self.assertEqual(len(formatted), 2)
+        logger_mock.warning.assert_called_once_with('The output was truncated to %d bytes.', 8)
+
+    def test_out_max_bytes_complete_lines(self):
+        self.mock_ctx.invocation.data['output_max_bytes'] = 10
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        result = CommandResultItem([{'a': 1, 'b': 'xx'}, {'a': 1, 'b': 'xxxx'}])
+        output_producer.out(result, formatter=format_tsv_chunks, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '1\txx\n')
+        self.assertEqual(result.exit_code, 3)
+
+        # A line split across chunks is only written once it is complete
+        @_streaming_formatter
+        def _formatter(_):
+            yield from ['ab', 'c\nde', 'f', 'ghijklmn\n']
+
+        self.io = StringIO()
+        output_producer.out(CommandResultItem(None), formatter=_formatter, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), 'abc\n')
+
+    def test_out_max_bytes_complete_frames(self):
+        self.mock_ctx.invocation.data['output_max_bytes'] = 12
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        out_file = BytesIO()
+        result = CommandResultItem(['abc', 'defg', 'hij'])
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            output_producer.out(result, formatter=_item_streaming_formatter(
+                lambda obj: _iter_frames(obj.result, str.encode)), out_file=out_file)
+        self.assertEqual(out_file.getvalue(), b'\x00\x00\x00\x03abc')
+        self.assertEqual(result.exit_code, 3)
+
+    def test_out_max_bytes_not_reached(self):
+        self.mock_ctx.invocation.data['output_max_bytes'] = 100
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem({'a': 1}), formatter=format_json, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '{\n  "a": 1\n}\n')
+        logger_mock.warning.assert_not_called()
+
+        result = CommandResultItem(['a', 'b'])
+        self.io = StringIO()
+        output_producer.out(result, formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '"a"\n"b"\n')
+        self.assertEqual(result.exit_code, 0)
+
+    def test_out_max_items_spill(self):
+        self.mock_ctx.config.set_value('core', 'output_spill', 'true')
+        self.mock_ctx.invocation.data['output_max_items'] = 2
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem(['a', '生', 'c']), formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '"a"\n"生"\n')
+        spill_path = logger_mock.warning.call_args[0][1]
+        with open(spill_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '"a"\n"生"\n"c"\n')
+        os.remove(spill_path)
+
+    def test_out_max_items_spill_formats_items_once(self):
+        self.mock_ctx.config.set_value('core', 'output_spill', 'true')
+        self.mock_ctx.invocation.data['output_max_items'] = 2
+        self.mock_ctx.invocation.data['output_max_bytes'] = 2
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        formatted = []
+
+        @_item_streaming_formatter
+        def _formatter(obj):
+            for item in obj.result:
+                formatted.append(item)
+                yield item + '\n'
+
+        with mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem(['a', 'b', 'c', 'd']), formatter=_formatter, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), 'a\n')
+        self.assertEqual(formatted, ['a', 'b', 'c', 'd'])
+        spill_path = logger_mock.warning.call_args[0][1]
+        with open(spill_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'a\nb\nc\nd\n')
+        os.remove(spill_path)
+
+    def test_out_max_items_spill_not_split(self):
+        self.mock_ctx.config.set_value('core', 'output_spill', 'true')
+        self.mock_ctx.invocation.data['output_max_items'] = 1
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem(['a', 'b']), formatter=format_json_compact, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '["a"]\n')
+        spill_path = logger_mock.warning.call_args[0][1]
+        with open(spill_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '["a","b"]\n')
+        os.remove(spill_path)
+
+    def test_out_max_bytes_spill(self):
+        self.mock_ctx.config.set_value('core', 'output_spill', 'true')
+        self.mock_ctx.invocation.data['output_max_bytes'] = 4
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 1), mock.patch('knack.output.logger') as logger_mock:
+            output_producer.out(CommandResultItem(['a', 'b', 'c']), formatter=format_jsonl, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '"a"\n')
+        spill_path = logger_mock.warning.call_args[0][1]
+        with open(spill_path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), '"a"\n"b"\n"c"\n')
+        os.remove(spill_path)
+
+    def test_out_spill_not_truncated(self):
+        self.mock_ctx.config.set_value('core', 'output_spill', 'true')
+        self.mock_ctx.invocation.data['output_max_bytes'] = 100
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('os.remove') as remove_mock:
+            output_producer.out(CommandResultItem(['a']), formatter=format_jsonl, out_file=self.io)
+        spill_path = remove_mock.call_args[0][0]
+        self.assertTrue(os.path.basename(spill_path).startswith('{}-output-'.format(self.mock_ctx.name)))
+        os.remove(spill_path)
+
     # YAML output tests
 
     def test_out_yaml_valid(self):
@@ -147,6 +560,42 @@ contents: !!binary ""
 contents: こんにちは
 """))
 
+    def test_out_yaml_emoji(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.out(CommandResultItem([{'contents': '生活 😀'}]), formatter=format_yaml, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), '- contents: 生活 😀\n')
+
+    def test_out_yaml_result_types(self):
+        class _StrEnum(str, Enum):
+            A = 'a'
+
+        class _IntEnum(IntEnum):
+            B = 2
+
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        obj = OrderedDict([('z', _StrEnum.A), ('y', (1, _IntEnum.B)), ('x', [OrderedDict([('b', 1), ('a', 2)])])])
+        with mock.patch('knack.output.json.dumps') as dumps_mock:
+            output_producer.out(CommandResultItem(obj), formatter=format_yaml, out_file=self.io)
+        dumps_mock.assert_not_called()
+        self.assertEqual(self.io.getvalue(), 'x:\n- a: 2\n  b: 1\ny:\n- 1\n- 2\nz: a\n')
+
+    def test_out_yaml_scalar(self):
+        self.assertEqual(format_yaml(CommandResultItem('x')), 'x\n...\n')
+        self.assertEqual(format_yaml(CommandResultItem([])), '[]\n')
+
+    def test_out_yaml_shared_objects(self):
+        tags = {'env': 'test'}
+        obj = [{'name': 'a', 'tags': tags}, {'name': 'b', 'tags': tags}]
+        expected = '- name: a\n  tags:\n    env: test\n- name: b\n  tags:\n    env: test\n'
+        # Objects found more than once are written out each time instead of as anchors and aliases
+        self.assertEqual(format_yaml(CommandResultItem(obj)), expected)
+        self.assertEqual(_remove_color(format_yaml_color(CommandResultItem(obj))), expected)
+
+    def test_out_yaml_chunks(self):
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            chunks = list(format_yaml_chunks(CommandResultItem([{'a': 1}, 'b', [1]])))
+        self.assertEqual(chunks, ['- a: 1\n- b\n', '- - 1\n'])
+
     # TABLE output tests
 
     def test_out_table(self):
@@ -275,6 +724,43 @@ qwerty  0b1f6472qwerty  True
         result = format_tsv(CommandResultItem([obj1, obj2]))
         self.assertEqual(result, '1\t2\n3\t4\n')
 
+    def test_output_format_tsv_rows_with_different_keys(self):
+        result = format_tsv(CommandResultItem([{'b': 1, 'a': 2}, {'a': 3, 'b': 4}, {'c': 5}, {}, True, None]))
+        self.assertEqual(result, '2\t1\n3\t4\n5\n\ntrue\nNone\n')
+
+    def test_out_tsv_chunks(self):
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            chunks = list(format_tsv_chunks(CommandResultItem([{'a': 1}, {'a': 'x\ty'}, {'a': None}])))
+        self.assertEqual(chunks, ['1\nx\ty\n', 'None\n'])
+
+    # CSV output tests
+
+    def test_out_csv(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        obj = [{'name': 'a,b', 'active': True, 'tags': {'x': 1}, 'ips': [1, 2], 'note': None},
+               {'name': 'say "hi"', 'active': False, 'tags': {}, 'ips': [], 'extra': 1}]
+        output_producer.out(CommandResultItem(obj), formatter=format_csv, out_file=self.io)
+        self.assertEqual(self.io.getvalue(),
+                         'active,ips,name,note,tags\n'
+                         'true,2,"a,b",,\n'
+                         'false,0,"say ""hi""",,\n')
+
+    def test_out_csv_ordereddict_not_sorted(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        obj = [OrderedDict([('B', 1), ('A', 2)]), OrderedDict([('A', 3), ('B', 4)])]
+        output_producer.out(CommandResultItem(obj), formatter=format_csv, out_file=self.io)
+        self.assertEqual(self.io.getvalue(), 'B,A\n1,2\n4,3\n')
+
+    def test_out_csv_chunks(self):
+        with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 2):
+            chunks = list(format_csv(CommandResultItem([{'a': 1}, {'a': 2}, {'a': 3}])))
+        self.assertEqual(chunks, ['a\n1\n2\n', '3\n'])
+
+    def test_out_csv_not_dict(self):
+        self.assertEqual(''.join(format_csv(CommandResultItem(['a', [1, 'b'], None]))), 'a\n1,b\n""\n')
+        self.assertEqual(''.join(format_csv(CommandResultItem({'a': 1}))), 'a\n1\n')
+        self.assertEqual(''.join(format_csv(CommandResultItem([]))), '')
+
     def test_remove_color_no_tty(self):
         output_producer = OutputProducer(cli_ctx=self.mock_ctx)
 
@@ -290,6 +776,69 @@ qwerty  0b1f6472qwerty  True
         formatter = output_producer.get_formatter('yamlc')
         self.assertEqual(formatter, format_yaml_color)
 
+    def test_get_formatter_returns_strings(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        result = CommandResultItem([{'a': 1}, {'a': 2}])
+        for format_type, expected in [('yaml', '- a: 1\n- a: 2\n'), ('tsv', '1\n2\n')]:
+            self.assertEqual(output_producer.get_formatter(format_type)(result), expected)
+            # out() writes the output of the same formatters in chunks
+            self.assertTrue(output_producer.supports_streaming(format_type))
+            out_file = mock.MagicMock()
+            with mock.patch('knack.output.STREAMING_CHUNK_SIZE', 1):
+                output_producer.out(result, formatter=output_producer.get_formatter(format_type), out_file=out_file)
+            self.assertEqual(''.join(call[0][0] for call in out_file.write.call_args_list), expected)
+            self.assertEqual(out_file.flush.call_count, 2)
+
+    # Formatter registry tests
+
+    def test_register_format(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        output_producer.register_format('Upper', _format_upper)
+        self.assertIn('upper', output_producer.formats)
+        self.assertFalse(output_producer.supports_streaming('upper'))
+        output_producer.out(CommandResultItem('abc'), formatter=output_producer.get_formatter('upper'),
+                            out_file=self.io)
+        self.assertEqual(self.io.getvalue(), 'ABC')
+        self.assertTrue(output_producer.supports_streaming('jsonl'))
+        self.assertFalse(output_producer.supports_streaming('json'))
+
+    def test_register_format_lazy(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with mock.patch('knack.output.import_module', wraps=__import__('importlib').import_module) as import_mock:
+            output_producer.register_format('upper', 'tests.test_output#_format_upper', streaming=True)
+            import_mock.assert_not_called()
+            self.assertEqual(output_producer.get_formatter('upper'), _format_upper)
+            self.assertTrue(output_producer.supports_streaming('upper'))
+            output_producer.get_formatter('upper')
+        import_mock.assert_called_once_with('tests.test_output')
+
+    def test_register_format_invalid(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        with self.assertRaises(ValueError):
+            output_producer.register_format('upper', 'tests.test_output._format_upper')
+        with self.assertRaises(TypeError):
+            output_producer.register_format('upper', 1)
+        output_producer.register_format('missing', 'tests.test_output#_format_missing')
+        with self.assertRaisesRegex(CLIError, "Unable to load the 'missing' output format"):
+            output_producer.get_formatter('missing')
+
+    def test_register_entry_point_formats(self):
+        output_producer = OutputProducer(cli_ctx=self.mock_ctx)
+        entry_point = mock.MagicMock(value='tests.test_output:_format_upper [extra]')
+        entry_point.name = 'upper'
+        eps = mock.MagicMock()
+        eps.select.return_value = [entry_point]
+        with mock.patch('importlib.metadata.entry_points', return_value=eps):
+            output_producer.register_entry_point_formats('test.output_formats')
+        eps.select.assert_called_once_with(group='test.output_formats')
+        self.assertIn('upper', output_producer.formats)
+        self.assertEqual(output_producer.get_formatter('upper'), _format_upper)
+        self.assertFalse(output_producer.supports_streaming('upper'))
+
+
+def _format_upper(obj):
+    return obj.result.upper()
+
 
 if __name__ == '__main__':
     unittest.main()
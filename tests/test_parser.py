@@ -3,12 +3,13 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import copy
 import unittest
 from io import StringIO
 
 from knack.parser import CLICommandParser
 from knack.commands import CLICommand
-from knack.arguments import enum_choice_list
+from knack.arguments import enum_choice_list, CaseInsensitiveList
 from tests.util import MockContext, redirect_io
 
 
@@ -115,6 +116,32 @@ class TestParser(unittest.TestCase):
         args = parser.parse_args('test command --opt sNake_CASE'.split())
         self.assertEqual(args.opt, 'snake_case')
 
+    def test_case_insensitive_list(self):
+        choices = CaseInsensitiveList(['b', 'ALL_CAPS', 'camelCase', 'All_Caps'])
+        self.assertIn('all_caps', choices)
+        self.assertNotIn('other', choices)
+        self.assertEqual(choices.get_choice('CAMELCASE'), 'camelCase')
+        self.assertEqual(choices.get_choice('all_caps'), 'ALL_CAPS')
+        self.assertIsNone(choices.get_choice('other'))
+        # The original order is kept for help and errors
+        self.assertEqual(list(choices), ['b', 'ALL_CAPS', 'camelCase', 'All_Caps'])
+
+        choices.append('Other')
+        self.assertIn('OTHER', choices)
+        choices.remove('Other')
+        self.assertNotIn('OTHER', choices)
+        choices[0] = 'C'
+        self.assertIn('c', choices)
+        self.assertNotIn('b', choices)
+        del choices[1]
+        self.assertEqual(choices.get_choice('all_caps'), 'All_Caps')
+        choices += ['d']
+        self.assertIn('D', choices)
+        copied = copy.copy(choices)
+        copied.clear()
+        self.assertNotIn('d', copied)
+        self.assertIn('d', choices)
+
     @redirect_io
     def test_check_value_invalid_command(self):
         parser = self._enum_parser()
@@ -131,6 +158,52 @@ class TestParser(unittest.TestCase):
         actual = self.io.getvalue()
         assert "is not a valid value for" in actual
 
+    def test_suggestion_index(self):
+        import difflib
+        import random
+        from knack.parser import _SuggestionIndex
+
+        rand = random.Random(0)
+        names = list({''.join(rand.choice('abcdef-') for _ in range(rand.randint(1, 8))) for _ in range(500)})
+        index = _SuggestionIndex(names)
+        for word in names[:100] + ['a', 'ab', 'fed', 'x', 'abcdefab']:
+            for cutoff in (0.0, 0.6, 0.7, 0.9):
+                self.assertEqual(index.get_close_matches(word, cutoff=cutoff),
+                                 difflib.get_close_matches(word, names, cutoff=cutoff))
+
+    def test_suggestion_index_reused(self):
+        from unittest import mock
+        from knack import parser as parser_module
+
+        names = ('create', 'delete', 'list', 'show', 'update')
+        parser_module._get_suggestion_index.cache_clear()
+        with mock.patch('knack.parser._SuggestionIndex', wraps=parser_module._SuggestionIndex) as index_mock, \
+                mock.patch('knack.parser._suggestion_lookups', set()):
+            # A single lookup uses difflib, and the index is built once the names are looked up again
+            self.assertEqual(parser_module._get_close_matches(names, 'lsit'), ['list'])
+            index_mock.assert_not_called()
+            self.assertEqual(parser_module._get_close_matches(names, 'shwo'), ['show'])
+            self.assertEqual(parser_module._get_close_matches(names, 'updte'), ['update'])
+            index_mock.assert_called_once_with(names)
+
+    def test_unrecognized_option_suggestions(self):
+        def test_handler():
+            pass
+
+        command = CLICommand(self.mock_ctx, 'test command', test_handler)
+        command.add_argument('name', '--name')
+        command.add_argument('names', '--names')
+        command.add_argument('other', '--other')
+        self.mock_ctx.commands_loader.command_table = {'test command': command}
+        parser = CLICommandParser()
+        parser.load_command_table(self.mock_ctx.commands_loader)
+
+        CLICommandParser.error = VerifyError(self, "unrecognized arguments: --nmae a --xyz=1\n"
+                                                   "The most similar choices to '--nmae':\n\t--name\n\t--names")
+        parser.parse_args('test command --nmae a --xyz=1'.split())
+        self.assertTrue(CLICommandParser.error.called)
+        self.assertNotIn("'--xyz=1'", CLICommandParser.error.message)
+
     def test_cli_ctx_type_error(self):
         with self.assertRaises(TypeError):
             CLICommandParser(cli_ctx=object())
@@ -180,6 +253,258 @@ class TestParser(unittest.TestCase):
 
         remove_test_file('test.json')
 
+    def test_prefix_file_mode(self):
+        import mmap
+        import os
+        import tempfile
+        from knack.util import LazyFile
+
+        def test_handler():
+            pass
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text_file = os.path.join(temp_dir, 'test.txt')
+            with open(text_file, 'w', encoding='utf-16') as f:
+                f.write('生活')
+            plain_file = os.path.join(temp_dir, 'plain.txt')
+            with open(plain_file, 'w') as f:
+                f.write('plain')
+            empty_file = os.path.join(temp_dir, 'empty.txt')
+            open(empty_file, 'w').close()
+
+            command = CLICommand(self.mock_ctx, 'test command', test_handler)
+            command.add_argument('stream', '--stream', file_mode='stream', file_encoding='utf-16')
+            command.add_argument('binary', '--binary', file_mode='binary')
+            command.add_argument('mapped', '--mapped', '-m', file_mode='mmap')
+            command.add_argument('count', '--count', file_mode='stream', type=int)
+            command.add_argument('streams', '--streams', nargs='+', file_mode='binary')
+            command.add_argument('text', '--text')
+            self.mock_ctx.commands_loader.command_table = {'test command': command}
+            parser = CLICommandParser()
+            parser.load_command_table(self.mock_ctx.commands_loader)
+
+            args = parser.parse_args(['test', 'command', '--stream', '@' + text_file, '--binary', '@' + text_file,
+                                      '-m', '@' + text_file, '--count', '3', '--text', '@' + plain_file])
+            self.assertIsInstance(args.stream, LazyFile)
+            with args.stream as f:
+                self.assertEqual(f.read(), '生活')
+            self.assertEqual(args.binary.read(), '生活'.encode('utf-16'))
+            args.binary.close()
+            self.assertIsInstance(args.mapped, mmap.mmap)
+            self.assertEqual(args.mapped[:], '生活'.encode('utf-16'))
+            args.mapped.close()
+            self.assertEqual(args.count, 3)
+            # Arguments without a file_mode are still loaded
+            self.assertEqual(args.text, 'plain')
+
+            args = parser.parse_args(['test', 'command', '--streams', '@' + text_file, '@' + plain_file,
+                                      '--text', '@' + plain_file])
+            self.assertEqual([type(value) for value in args.streams], [LazyFile, LazyFile])
+            self.assertEqual(args.streams[1].read(), b'plain')
+            args.streams[1].close()
+            self.assertEqual(args.text, 'plain')
+
+            args = parser.parse_args(['test', 'command', '--mapped=@' + empty_file, '--stream', '@missing.txt'])
+            self.assertEqual(args.mapped, b'')
+            self.assertEqual(args.stream, '@missing.txt')
+
+    def test_prefix_file_expansion_concurrent(self):
+        import os
+        import tempfile
+        from unittest import mock
+        from knack import parser as parser_module
+
+        def test_handler():
+            pass
+
+        command = CLICommand(self.mock_ctx, 'test command', test_handler)
+        command.add_argument('first', '--first')
+        command.add_argument('second', '--second')
+        command.add_argument('third', '--third')
+        self.mock_ctx.commands_loader.command_table = {'test command': command}
+        parser = CLICommandParser()
+        parser.load_command_table(self.mock_ctx.commands_loader)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            paths = []
+            for name in ('first', 'second'):
+                paths.append(os.path.join(temp_dir, name))
+                with open(paths[-1], 'w') as f:
+                    f.write(name + ' content')
+            with mock.patch('knack.parser._create_file_reader', wraps=parser_module._create_file_reader) as reader_mock:
+                args = parser.parse_args(['test', 'command', '--first', '@' + paths[0], '--second', '@' + paths[1],
+                                          '--third', '@missing.txt'])
+            reader_mock.assert_called_once_with(3)
+        self.assertEqual(args.first, 'first content')
+        self.assertEqual(args.second, 'second content')
+        # Files that can't be opened leave the argument unchanged
+        self.assertEqual(args.third, '@missing.txt')
+
+    def test_prefix_file_prefetch(self):
+        import os
+        import tempfile
+        from unittest import mock
+        from knack import parser as parser_module
+
+        def test_handler():
+            pass
+
+        command = CLICommand(self.mock_ctx, 'test command', test_handler)
+        command.add_argument('first', '--first')
+        command.add_argument('second', '--second', file_mode='stream')
+        self.mock_ctx.commands_loader.command_table = {'test command': command}
+        parser = CLICommandParser()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'first')
+            with open(path, 'w') as f:
+                f.write('content')
+            args = ['test', 'command', '--first', '@' + path, '--second', '@' + path]
+            parser.prefetch_prefixed_files(args)
+            parser.load_command_table(self.mock_ctx.commands_loader)
+            for future in parser._prefetched_files.values():
+                future.result()
+            with mock.patch('knack.parser._read_prefixed_file', wraps=parser_module._read_prefixed_file) as read_mock:
+                parsed_args = parser.parse_args(args)
+            # The file was read by the prefetch
+            read_mock.assert_not_called()
+            self.assertEqual(parsed_args.first, 'content')
+            with parsed_args.second as f:
+                self.assertEqual(f.read(), 'content')
+
+    def test_prefix_file_prefetch_skips_file_mode(self):
+        import os
+        import tempfile
+        from unittest import mock
+        from knack import parser as parser_module
+
+        def test_handler():
+            pass
+
+        command = CLICommand(self.mock_ctx, 'test command', test_handler)
+        command.add_argument('first', '--first')
+        command.add_argument('second', '--second', file_mode='stream')
+        self.mock_ctx.commands_loader.command_table = {'test command': command}
+        parser = CLICommandParser()
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, 'first')
+            with open(path, 'w') as f:
+                f.write('content')
+            # Files larger than the limit aren't read until the options of the command are known
+            args = ['test', 'command', '--first', '@' + path]
+            with mock.patch('knack.parser.MAX_PREFETCH_FILE_SIZE', 3), \
+                    mock.patch('knack.parser._read_prefixed_file', wraps=parser_module._read_prefixed_file) as read_mock:
+                parser.prefetch_prefixed_files(args)
+                parser.load_command_table(self.mock_ctx.commands_loader)
+                parsed_args = parser.parse_args(args)
+            read_mock.assert_called_once_with(path)
+            self.assertEqual(parsed_args.first, 'content')
+
+            # The values of the options with a file_mode in the loaded commands aren't read
+            with mock.patch('knack.parser._create_file_reader') as reader_mock:
+                parser.prefetch_prefixed_files(['test', 'command', '--second', '@' + path])
+            reader_mock.assert_not_called()
+
+    def test_prefix_file_mode_invalid(self):
+        def test_handler():
+            pass
+
+        command = CLICommand(self.mock_ctx, 'test command', test_handler)
+        command.add_argument('stream', '--stream', file_mode='lazy')
+        self.mock_ctx.commands_loader.command_table = {'test command': command}
+        parser = CLICommandParser()
+        with self.assertRaisesRegex(ValueError, "The file_mode 'lazy' of argument 'stream' is invalid"):
+            parser.load_command_table(self.mock_ctx.commands_loader)
+
+    @redirect_io
+    def test_fast_parser(self):
+        import argparse
+        from unittest import mock
+
+        def test_handler():
+            pass
+
+        command = CLICommand(self.mock_ctx, 'test command', test_handler)
+        command.add_argument('name', '--name', '-n', required=True)
+        command.add_argument('count', '--count', type=int, default='5')
+        command.add_argument('color', '--color', **enum_choice_list(['red', 'green']))
+        command.add_argument('force', '--force', action='store_true')
+        command.add_argument('mode', '--mode', action='store_const', const='fast')
+        command.add_argument('tags', '--tags', nargs='+')
+        command.add_argument('level', '--level', nargs='?', const='high')
+        command.add_argument('point', '--point', nargs=2, type=int)
+        command.add_argument('items', '--items', action='append')
+        other = CLICommand(self.mock_ctx, 'other', test_handler)
+        self.mock_ctx.commands_loader.command_table = {'test command': command, 'other': other}
+        self.mock_ctx.config.set_value('core', 'fast_parser', 'true')
+
+        fast_parser = CLICommandParser(cli_ctx=self.mock_ctx)
+        fast_parser.load_command_table(self.mock_ctx.commands_loader)
+        parser = CLICommandParser()
+        parser.load_command_table(self.mock_ctx.commands_loader)
+
+        def _parse(args):
+            with mock.patch.object(argparse.ArgumentParser, 'parse_known_args', autospec=True,
+                                   side_effect=argparse.ArgumentParser.parse_known_args) as parse_mock:
+                fast_args = vars(fast_parser.parse_args(args))
+            expected = vars(parser.parse_args(args))
+            self.assertIs(fast_args.pop('_parser'), fast_parser.subparsers[('test',)].choices['command']
+                          if args[0] == 'test' else fast_parser.subparsers[()].choices['other'])
+            expected.pop('_parser')
+            self.assertEqual(fast_args, expected)
+            return parse_mock.called
+
+        # Parsed by the fast parser
+        self.assertFalse(_parse(['other']))
+        self.assertFalse(_parse('test command --name a'.split()))
+        self.assertFalse(_parse('test command -n a --count 7 --color GREEN --force --mode'.split()))
+        self.assertFalse(_parse('test command --name=a --name b --tags x y z --level --point 1 2'.split()))
+        self.assertFalse(_parse('test command --level low --tags x --name a --count=-1'.split()))
+
+        # Parsed by argparse
+        self.assertTrue(_parse('test command --name a --items x'.split()))
+        self.assertTrue(_parse('test command --na a'.split()))
+        self.assertTrue(_parse('test command --name a --count -1'.split()))
+        self.assertTrue(_parse('test command -nabc'.split()))
+
+        # Errors are reported by argparse, or like argparse reports them once the values are converted
+        for args, fast in [('test command', False), ('test command --name a --point 1', False),
+                           ('test command --name a extra', False), ('test command --name a -x', False),
+                           ('test command --name a --count x', True)]:
+            CLICommandParser.error = VerifyError(self)
+            with mock.patch.object(argparse.ArgumentParser, 'parse_known_args', autospec=True,
+                                   side_effect=argparse.ArgumentParser.parse_known_args) as parse_mock:
+                fast_parser.parse_args(args.split())
+            self.assertEqual(parse_mock.called, not fast, args)
+            self.assertTrue(CLICommandParser.error.called, args)
+            if fast:
+                self.assertEqual(CLICommandParser.error.message, "argument --count: invalid int value: 'x'")
+        with self.assertRaises(SystemExit):
+            fast_parser.parse_args('test command --name a --color blue'.split())
+        self.assertIn("is not a valid value for", self.io.getvalue())
+
+    def test_fast_parser_converts_once(self):
+        converted = []
+
+        def _size(value):
+            converted.append(value)
+            return int(value)
+
+        command = CLICommand(self.mock_ctx, 'test command', lambda: None)
+        command.add_argument('size', '--size', type=_size, default='1')
+        command.add_argument('items', '--items', action='append')
+        self.mock_ctx.commands_loader.command_table = {'test command': command}
+        self.mock_ctx.config.set_value('core', 'fast_parser', 'true')
+        parser = CLICommandParser(cli_ctx=self.mock_ctx)
+        parser.load_command_table(self.mock_ctx.commands_loader)
+
+        # The fast parser leaves the append action to argparse before converting the size
+        for args, expected in [('--size 2', ['2']), ('--size 3 --items x', ['3']), ('--items x', ['1'])]:
+            del converted[:]
+            self.assertEqual(parser.parse_args(['test', 'command'] + args.split()).size, int(expected[0]))
+            self.assertEqual(converted, expected, args)
+
 
 class VerifyError(object):  # pylint: disable=too-few-public-methods
 
@@ -187,8 +512,10 @@ class VerifyError(object):  # pylint: disable=too-few-public-methods
         self.test = test
         self.substr = substr
         self.called = False
+        self.message = None
 
     def __call__(self, message):
+        self.message = message
         if self.substr:
             self.test.assertGreaterEqual(message.find(self.substr), 0)
         self.called = True
@@ -3,12 +3,13 @@
 # Licensed under the MIT License. See License.txt in the project root for license information.
 # --------------------------------------------------------------------------------------------
 
+import os
 import unittest
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from datetime import date, time, datetime
 from unittest import mock
 
-from knack.util import todict, to_snake_case, is_modern_terminal
+from knack.util import todict, todict_lazy, LazyDict, LazyFile, to_snake_case, is_modern_terminal, run_awaitable
 
 
 class TestUtils(unittest.TestCase):
@@ -70,6 +71,91 @@ class TestUtils(unittest.TestCase):
         expected = the_input.isoformat()
         self.assertEqual(actual, expected)
 
+    def test_application_todict_obj_camel_case(self):
+        class MyObject:  # pylint: disable=too-few-public-methods
+            def __init__(self):
+                self.provisioning_state = 'Succeeded'
+                self.creation_time = datetime(2017, 10, 13, 1, 23, 45)
+                self._private = 'hidden'
+                self.method = lambda: None
+
+        actual = todict([MyObject()])
+        expected = [{'provisioningState': 'Succeeded', 'creationTime': '2017-10-13T01:23:45'}]
+        self.assertEqual(actual, expected)
+
+    def test_application_todict_json_native_not_copied(self):
+        the_input = {'a': [1, 'b', {'c': None}], 'd': 1.5}
+        self.assertIs(todict(the_input), the_input)
+
+        # A copy is only made for the containers that have changed
+        the_input = {'a': [1, date(2017, 10, 13)], 'b': {'c': 1}}
+        actual = todict(the_input)
+        self.assertIsNot(actual, the_input)
+        self.assertEqual(actual, {'a': [1, '2017-10-13'], 'b': {'c': 1}})
+        self.assertEqual(the_input['a'][1], date(2017, 10, 13))
+        self.assertIs(actual['b'], the_input['b'])
+
+    def test_application_todict_ordered_dict(self):
+        actual = todict(OrderedDict([('b', 1), ('a', 2)]))
+        self.assertIs(type(actual), dict)
+        self.assertEqual(list(actual), ['b', 'a'])
+
+    def test_application_todict_post_processor(self):
+        the_input = {'a': 'b'}
+        actual = todict(the_input, post_processor=lambda obj, result: dict(result, processed=True))
+        self.assertEqual(actual, {'a': 'b', 'processed': True})
+        self.assertEqual(the_input, {'a': 'b'})
+
+    def test_application_todict_circular_reference(self):
+        the_input = {'a': []}
+        the_input['a'].append(the_input)
+        with self.assertRaisesRegex(ValueError, 'circular reference'):
+            todict(the_input)
+
+        # The same object may appear multiple times if it doesn't contain itself
+        shared = {'a': 1}
+        self.assertEqual(todict([shared, shared]), [{'a': 1}, {'a': 1}])
+
+    def test_application_todict_limits(self):
+        the_input = {'a': {'b': {'c': 1}}}
+        self.assertEqual(todict(the_input, max_depth=2), the_input)
+        with self.assertRaisesRegex(ValueError, 'more than 1 levels deep'):
+            todict(the_input, max_depth=1)
+
+        the_input = [{'a': 1}, {'b': 2}]
+        self.assertEqual(todict(the_input, max_items=4), the_input)
+        with self.assertRaisesRegex(ValueError, 'more than 3 items'):
+            todict(the_input, max_items=3)
+
+    def test_application_todict_lazy(self):
+        class MyObject:  # pylint: disable=too-few-public-methods
+            def __init__(self, **kwargs):
+                self.__dict__.update(kwargs)
+
+        the_input = [MyObject(resource_name='a', created=date(2017, 10, 13), nested=MyObject(some_value=1))]
+        actual = todict_lazy(the_input)
+        self.assertIsInstance(actual, list)
+        self.assertIsInstance(actual[0], LazyDict)
+        self.assertEqual(sorted(actual[0]), ['created', 'nested', 'resourceName'])
+        # Values are only converted when they are accessed
+        self.assertIsInstance(dict.__getitem__(actual[0], 'created'), date)
+        self.assertEqual(actual[0]['created'], '2017-10-13')
+        self.assertIsInstance(dict.__getitem__(actual[0], 'nested'), MyObject)
+        self.assertEqual(actual[0].get('nested'), {'someValue': 1})
+
+        # todict converts what is left into plain dicts
+        self.assertEqual(todict(todict_lazy(the_input)), todict(the_input))
+        self.assertIs(type(todict(actual)[0]), dict)
+
+    def test_application_todict_kinds_cache_size(self):
+        from collections import namedtuple
+        from knack import util
+        with mock.patch.object(util, '_todict_kinds', {}) as kinds:
+            for index in range(util._TODICT_KINDS_MAX_SIZE + 10):  # pylint: disable=protected-access
+                point = namedtuple('Point{}'.format(index), ['x'])
+                self.assertEqual(todict(point(index)), {'x': index})
+            self.assertEqual(len(kinds), util._TODICT_KINDS_MAX_SIZE)  # pylint: disable=protected-access
+
     def test_to_snake_case_from_camel(self):
         the_input = 'thisIsCamelCase'
         expected = 'this_is_camel_case'
@@ -98,6 +184,44 @@ class TestUtils(unittest.TestCase):
         with mock.patch.dict("os.environ", WT_SESSION='c25cb945-246a-49e5-b37a-1e4b6671b916'):
             self.assertEqual(is_modern_terminal(), True)
 
+    def test_lazy_file_copy(self):
+        import copy
+        import pickle
+        import tempfile
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('content')
+        try:
+            lazy_file = LazyFile(f.name)
+            for copied in [copy.copy(lazy_file), pickle.loads(pickle.dumps(lazy_file))]:
+                with copied as copied_file:
+                    self.assertEqual(copied_file.read(), 'content')
+            with self.assertRaises(AttributeError):
+                getattr(LazyFile.__new__(LazyFile), 'read')
+        finally:
+            os.remove(f.name)
+
+    def test_run_awaitable(self):
+        import asyncio
+
+        async def _double(value):
+            await asyncio.sleep(0)
+            return value * 2
+
+        self.assertEqual(run_awaitable(_double(2)), 4)
+
+        async def _run_on_own_loop():
+            return run_awaitable(_double(3), asyncio.get_running_loop())
+
+        with self.assertRaisesRegex(RuntimeError, "Can't wait on the event loop of the current thread"):
+            asyncio.run(_run_on_own_loop())
+
+        # A loop that isn't running is run until the awaitable is done
+        loop = asyncio.new_event_loop()
+        try:
+            self.assertEqual(run_awaitable(_double(4), loop), 8)
+        finally:
+            loop.close()
+
 
 if __name__ == '__main__':
     unittest.main()
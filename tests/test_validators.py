@@ -0,0 +1,310 @@
+# --------------------------------------------------------------------------------------------
+# Copyright (c) Microsoft Corporation. All rights reserved.
+# Licensed under the MIT License. See License.txt in the project root for license information.
+# --------------------------------------------------------------------------------------------
+
+import threading
+import unittest
+from argparse import Namespace
+
+from knack.commands import CLICommand
+from knack.invocation import CommandInvoker
+from knack.util import CLIError
+from knack.validators import cache_validation, depends_on, get_validator_waves, run_validators
+from tests.util import MockContext, new_temp_folder
+
+
+class TestValidators(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_ctx = MockContext()
+
+    def invoke_with_command_table(self, command, command_table):
+        self.mock_ctx.invocation = CommandInvoker(cli_ctx=self.mock_ctx)
+        self.mock_ctx.invocation.commands_loader.command_table = command_table
+        return self.mock_ctx.invocation.execute(command.split())
+
+    def test_validator_waves(self):
+        @depends_on()
+        def a(_):
+            pass
+
+        @depends_on('a')
+        def b(_):
+            pass
+
+        @depends_on()
+        def c(_):
+            pass
+
+        @depends_on('b', 'c')
+        def d(_):
+            pass
+
+        def undeclared(_):
+            pass
+
+        self.assertEqual(get_validator_waves([d, b, a, c], ['d', 'b', 'a', 'c']), [[a, c], [b], [d]])
+        # The validators of unknown arguments don't wait for anything
+        self.assertEqual(get_validator_waves([b, d], ['b', 'd']), [[b], [d]])
+        # The dependencies can't be honored without the destinations
+        self.assertEqual(get_validator_waves([b, a], [None, None]), [[b], [a]])
+        self.assertEqual(get_validator_waves([b, a], []), [[b], [a]])
+        # Validators that don't declare their dependencies run in order
+        self.assertEqual(get_validator_waves([d, undeclared, a], ['d', 'x', 'a']), [[d], [undeclared], [a]])
+
+        @depends_on('b')
+        def cyclic(_):
+            pass
+
+        self.assertEqual(get_validator_waves([b, cyclic, c], ['b', 'a', 'c']), [[c], [b], [cyclic]])
+
+    def test_validators_run_concurrently(self):
+        import asyncio
+        barrier = threading.Barrier(2, timeout=5)
+
+        @depends_on()
+        def validate_first(namespace):
+            barrier.wait()
+            namespace.first = namespace.first.upper()
+
+        @depends_on()
+        def validate_second(namespace):
+            barrier.wait()
+            namespace.second = namespace.second.upper()
+
+        @depends_on()
+        async def validate_third(namespace):
+            await asyncio.sleep(0)
+            namespace.third = namespace.third.upper()
+
+        @depends_on('first', 'second', 'third')
+        def validate_all(namespace):
+            namespace.all = '-'.join([namespace.first, namespace.second, namespace.third])
+
+        def handler(args):
+            return [args['all'], args['first'], args['second'], args['third']]
+
+        command = CLICommand(self.mock_ctx, 'test command', handler)
+        command.add_argument('all', '--all', validator=validate_all)
+        command.add_argument('first', '--first', validator=validate_first)
+        command.add_argument('second', '--second', validator=validate_second)
+        command.add_argument('third', '--third', validator=validate_third)
+        result = self.invoke_with_command_table('test command --first a --second b --third c',
+                                                {'test command': command})
+        self.assertEqual(result.result, ['A-B-C', 'A', 'B', 'C'])
+
+    def test_validator_errors_are_joined(self):
+        @depends_on()
+        def validate_first(_):
+            raise CLIError('first is invalid')
+
+        @depends_on()
+        def validate_second(_):
+            try:
+                {}['second']
+            except KeyError:
+                raise ValueError('second is invalid')  # pylint: disable=raise-missing-from
+
+        @depends_on('first', 'second')
+        def validate_third(_):
+            raise AssertionError('validators after the errors must not run')
+
+        command = CLICommand(self.mock_ctx, 'test command', lambda args: None)
+        command.add_argument('first', '--first', validator=validate_first)
+        command.add_argument('second', '--second', validator=validate_second)
+        command.add_argument('third', '--third', validator=validate_third)
+        with self.assertRaisesRegex(CLIError, '^first is invalid\nsecond is invalid$') as cm:
+            self.invoke_with_command_table('test command', {'test command': command})
+        self.assertIsInstance(cm.exception.__cause__, CLIError)
+        self.assertEqual(str(cm.exception.__cause__), 'first is invalid')
+
+        # A single error is raised as it is, with its own context
+        with self.assertRaisesRegex(ValueError, '^second is invalid$') as cm:
+            run_validators([validate_second, depends_on()(lambda _: None)], ['second', 'other'], Namespace())
+        self.assertIsInstance(cm.exception.__context__, KeyError)
+
+    def test_async_command_validator(self):
+        async def validate(namespace):
+            namespace.value = 'validated'
+
+        command = CLICommand(self.mock_ctx, 'test command', lambda args: args['value'], validator=validate)
+        command.add_argument('value', '--value')
+        result = self.invoke_with_command_table('test command --value a', {'test command': command})
+        self.assertEqual(result.result, 'validated')
+
+    def test_async_validators_event_loop(self):
+        import asyncio
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever)
+        loop_thread.start()
+        loops = []
+
+        async def validate(_):
+            loops.append(asyncio.get_running_loop())
+
+        @depends_on()
+        async def validate_first(_):
+            loops.append(asyncio.get_running_loop())
+
+        @depends_on('first')
+        async def validate_second(_):
+            loops.append(asyncio.get_running_loop())
+
+        command = CLICommand(self.mock_ctx, 'test command', lambda args: None, validator=validate)
+        other_command = CLICommand(self.mock_ctx, 'other command', lambda args: None)
+        other_command.add_argument('first', '--first', validator=validate_first)
+        other_command.add_argument('other', '--other', validator=depends_on()(lambda _: None))
+        other_command.add_argument('second', '--second', validator=validate_second)
+        command_table = {'test command': command, 'other command': other_command}
+        try:
+            self.mock_ctx.event_loop = loop
+            self.invoke_with_command_table('test command', command_table)
+            self.invoke_with_command_table('other command', command_table)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            loop_thread.join()
+            loop.close()
+        # The validators ran on the loop of the CLI, concurrently and then alone
+        self.assertEqual(loops, [loop, loop, loop])
+
+    def test_cached_validator(self):
+        from unittest import mock
+        calls = []
+
+        @cache_validation(ttl=60, keys=['name'], config=[('defaults', 'group')])
+        def validate_name(namespace):
+            calls.append(namespace.name)
+            namespace.name_id = '/ids/' + namespace.name
+            del namespace.extra
+
+        def handler(args):
+            return [args['name_id'], 'extra' in args]
+
+        command = CLICommand(self.mock_ctx, 'test command', handler)
+        command.add_argument('name', '--name', validator=validate_name)
+        command.add_argument('extra', '--extra')
+        command_table = {'test command': command}
+
+        with mock.patch('time.monotonic', return_value=0):
+            for args in ['--name a', '--name a --extra x', '--name b', '--name a']:
+                result = self.invoke_with_command_table('test command ' + args, command_table)
+                self.assertEqual(result.result, ['/ids/' + args.split()[1], False])
+            self.assertEqual(calls, ['a', 'b'])
+
+            self.mock_ctx.config.set_value('defaults', 'group', 'other')
+            self.invoke_with_command_table('test command --name a', command_table)
+            self.assertEqual(calls, ['a', 'b', 'a'])
+
+        # The cached changes expire
+        with mock.patch('time.monotonic', return_value=61):
+            self.invoke_with_command_table('test command --name a', command_table)
+        self.assertEqual(calls, ['a', 'b', 'a', 'a'])
+
+        self.mock_ctx.validation_cache.clear()
+        self.invoke_with_command_table('test command --name a', command_table)
+        self.assertEqual(calls, ['a', 'b', 'a', 'a', 'a'])
+
+    def test_cached_validator_cli_invoke(self):
+        from collections import OrderedDict
+        from io import StringIO
+        from knack import CLI
+        from knack.commands import CLICommandsLoader
+        calls = []
+
+        @cache_validation()
+        def validate_name(namespace):
+            calls.append(namespace.name)
+            namespace.tags = ['tag-' + namespace.name]
+
+        def handler(args):
+            # Changing the value in one invocation doesn't change the cached one
+            args['tags'].append('extra')
+            return args['tags']
+
+        class _CommandsLoader(CLICommandsLoader):
+            def load_command_table(self, args):
+                command = CLICommand(self.cli_ctx, 'test command', handler)
+                command.add_argument('name', '--name', validator=validate_name)
+                command.add_argument('tags', '--tags')
+                self.command_table['test command'] = command
+                return OrderedDict(self.command_table)
+
+        cli = CLI(cli_name='exapp1', config_dir=new_temp_folder(), commands_loader_cls=_CommandsLoader)
+        for _ in range(3):
+            out_file = StringIO()
+            exit_code = cli.invoke(['test', 'command', '--name', 'a', '-o', 'json-compact'], out_file=out_file)
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(out_file.getvalue(), '["tag-a","extra"]\n')
+        self.assertEqual(calls, ['a'])
+
+    def test_cached_validators_size_bound(self):
+        from unittest import mock
+
+        def make_validator():
+            @cache_validation()
+            def validate(namespace):
+                namespace.value = namespace.value.upper()
+            return validate
+
+        with mock.patch('knack.validators.MAX_CACHED_VALIDATIONS', 3):
+            # The validators are new objects in each invocation
+            for value in 'abcde':
+                command = CLICommand(self.mock_ctx, 'test command', lambda args: args['value'])
+                command.add_argument('value', '--value', validator=make_validator())
+                result = self.invoke_with_command_table('test command --value ' + value, {'test command': command})
+                self.assertEqual(result.result, value.upper())
+            cache = self.mock_ctx.validation_cache
+            self.assertEqual(cache._size, 3)
+            self.assertEqual(sum(len(entries) for entries in cache._entries.values()), 3)
+
+    def test_cached_validators_run_concurrently(self):
+        calls = []
+
+        @cache_validation()
+        @depends_on()
+        def validate_first(namespace):
+            calls.append('first')
+            namespace.first = namespace.first.upper()
+
+        @depends_on()
+        @cache_validation(maxsize=1)
+        async def validate_second(namespace):
+            calls.append('second')
+            namespace.second = namespace.second.upper()
+
+        command = CLICommand(self.mock_ctx, 'test command', lambda args: [args['first'], args['second']])
+        command.add_argument('first', '--first', validator=validate_first)
+        command.add_argument('second', '--second', validator=validate_second)
+        command_table = {'test command': command}
+        for args, expected in [('--first a --second b', ['A', 'B']), ('--first a --second c', ['A', 'C']),
+                               ('--first a --second b', ['A', 'B'])]:
+            result = self.invoke_with_command_table('test command ' + args, command_table)
+            self.assertEqual(result.result, expected)
+        # The validators depend on all the arguments by default, and only one change of the second is cached
+        self.assertEqual(sorted(calls), ['first', 'first', 'second', 'second', 'second'])
+        result = self.invoke_with_command_table('test command --first a --second b', command_table)
+        self.assertEqual(result.result, ['A', 'B'])
+        self.assertEqual(len(calls), 5)
+
+    def test_cached_validator_unhashable_values(self):
+        calls = []
+
+        @cache_validation()
+        def validate(namespace):
+            calls.append(namespace.values)
+
+        command = CLICommand(self.mock_ctx, 'test command', lambda args: None)
+        command.add_argument('values', '--values', nargs='+', validator=validate,
+                             type=lambda value: {'value': [value]})
+        for _ in range(2):
+            self.invoke_with_command_table('test command --values a b', {'test command': command})
+        self.assertEqual(len(calls), 1)
+        command.add_argument('values', '--values', nargs='+', validator=validate, type=lambda value: {value})
+        for _ in range(2):
+            self.invoke_with_command_table('test command --values a b', {'test command': command})
+        self.assertEqual(len(calls), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()